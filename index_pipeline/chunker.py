@@ -1,8 +1,10 @@
 import uuid
-from typing import List, Optional
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from transformers import AutoTokenizer
 from llama_index.core.readers import SimpleDirectoryReader
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.schema import BaseNode
+from llama_index.core.schema import BaseNode, Document
 
 from config import Config
 from logger import JSONLogger
@@ -11,16 +13,49 @@ import os
 class DocumentChunker:
     """Handles document chunking with comprehensive logging"""
     
+    # Document-level metadata keys copied onto every chunk
+    _META_KEYS = (
+        "DOC_DESCRIPTION",
+        "DOC_TITLE",
+        "DOC_DESCRIPTION_FORMATTED",
+        "TAGS",
+        "PRESENTATION_DATE",
+        "DOC_MODULE",
+        "PRESENTATION_LINK",
+        "PRESENTER_1_NAME",
+    )
+    
     def __init__(self, logger: JSONLogger):
         self.logger = logger
+        
+        # Count tokens with the embedding model's own Rust-backed fast tokenizer
+        tokenizer = AutoTokenizer.from_pretrained(Config.EMBED_MODEL_NAME, use_fast=True)
+        if not tokenizer.is_fast:
+            print(f"Warning: No fast tokenizer available for {Config.EMBED_MODEL_NAME}")
+        
         self.chunker = SentenceSplitter(
             chunk_size=Config.CHUNK_SIZE,
             chunk_overlap=Config.CHUNK_OVERLAP,
+            tokenizer=partial(tokenizer.encode, add_special_tokens=False),
             include_metadata=True,
             include_prev_next_rel=True
         )
     
-    def chunk_document(self, txt_path: str, source_filename: str , doc_metadata: dict = None) -> Optional[List[BaseNode]]:
+    def _document_metadata(self, doc_metadata: Optional[dict], doc_ref_id: str) -> dict:
+        """Build the metadata attached to every chunk of a document"""
+        doc_metadata = doc_metadata or {}
+        metadata = {key: doc_metadata.get(key, "") for key in self._META_KEYS}
+        metadata["DOC_REF_ID"] = doc_ref_id
+        return metadata
+    
+    def _text_stats(self, documents: List[Document]) -> Dict[str, int]:
+        """Character and approximate word counts of already loaded documents"""
+        return {
+            "text_length": sum(len(doc.text) for doc in documents),
+            "word_count": sum(doc.text.count(" ") + 1 for doc in documents if doc.text)
+        }
+    
+    def chunk_document(self, txt_path: str, source_filename: str , doc_metadata: dict = None) -> Optional[Tuple[List[BaseNode], Dict[str, int]]]:
         """
         Chunk a text document into smaller pieces
         
@@ -29,14 +64,14 @@ class DocumentChunker:
             source_filename: Original source filename for metadata
             
         Returns:
-            List of document nodes if successful, None otherwise
+            Tuple of (document nodes, text statistics) if successful, None otherwise
         """
 
         if not os.path.exists(txt_path):
             self.logger.log_chunking_error(source_filename, txt_path, "File not found")
             return None
     
-        txt_filename = txt_path.split('/')[-1]  # Extract filename from path
+        txt_filename = os.path.basename(txt_path)
         
         # Log chunking start
         # self.logger.log_chunking_start(txt_filename, txt_path)
@@ -55,20 +90,11 @@ class DocumentChunker:
             doc_ref_id = str(uuid.uuid4())
             
             # Process each document (usually just one for a single file)
+            metadata = self._document_metadata(doc_metadata, doc_ref_id)
             all_nodes = []
             for doc in documents:
                 # Add metadata
-                doc.metadata.update({
-                    "DOC_DESCRIPTION": doc_metadata.get("DOC_DESCRIPTION", ""),
-                    "DOC_TITLE": doc_metadata.get("DOC_TITLE", ""),
-                    "DOC_DESCRIPTION_FORMATTED": doc_metadata.get("DOC_DESCRIPTION_FORMATTED", ""),
-                    "TAGS": doc_metadata.get("TAGS", ""),
-                    "PRESENTATION_DATE": doc_metadata.get("PRESENTATION_DATE", ""),
-                    "DOC_MODULE": doc_metadata.get("DOC_MODULE", ""),
-                    "PRESENTATION_LINK" : doc_metadata.get("PRESENTATION_LINK", ""),
-                    "PRESENTER_1_NAME" : doc_metadata.get("PRESENTER_1_NAME", ""),
-                    "DOC_REF_ID" : doc_ref_id,
-                })
+                doc.metadata.update(metadata)
                 
                 # Create chunks
                 nodes = self.chunker.get_nodes_from_documents([doc])
@@ -78,12 +104,83 @@ class DocumentChunker:
             # chunks_created = len(all_nodes)
             # self.logger.log_chunking_success(txt_filename, txt_path, chunks_created, doc_ref_id)
             
-            return all_nodes
+            return all_nodes, self._text_stats(documents)
             
         except Exception as e:
             self.logger.log_chunking_error(txt_filename, txt_path, str(e))
             return None
     
+    def chunk_documents_batch(self, txt_paths: List[str], metadatas: List[dict] = None) -> Dict[str, Tuple[List[BaseNode], Dict[str, int]]]:
+        """
+        Chunk several text documents with a single reader and splitter pass
+        
+        Args:
+            txt_paths: Paths to the text files
+            metadatas: Metadata for each file, in the same order as txt_paths
+            
+        Returns:
+            Dict mapping each successfully chunked txt_path to (nodes, text statistics)
+        """
+        if metadatas is None:
+            metadatas = [{} for _ in txt_paths]
+        
+        files = {}
+        for txt_path, doc_metadata in zip(txt_paths, metadatas):
+            if not os.path.exists(txt_path):
+                self.logger.log_chunking_error(os.path.basename(txt_path), txt_path, "File not found")
+                continue
+            # Keyed by real path so reader metadata can be matched back to the input
+            files[os.path.realpath(txt_path)] = (txt_path, doc_metadata, self._document_metadata(doc_metadata, str(uuid.uuid4())))
+        
+        if not files:
+            return {}
+        
+        try:
+            # Load all documents at once
+            reader = SimpleDirectoryReader(input_files=[txt_path for txt_path, _, _ in files.values()])
+            num_workers = min(Config.READER_WORKERS, len(files))
+            if num_workers > 1:
+                try:
+                    documents = reader.load_data(num_workers=num_workers)
+                except TypeError:
+                    # Older LlamaIndex releases have no num_workers argument
+                    documents = reader.load_data()
+            else:
+                documents = reader.load_data()
+            
+            # Attach metadata and a per-file reference ID to every document
+            doc_paths = {}
+            docs_by_path = {}
+            for doc in documents:
+                txt_path, _, metadata = files[os.path.realpath(doc.metadata["file_path"])]
+                doc.metadata.update(metadata)
+                doc_paths[doc.doc_id] = txt_path
+                docs_by_path.setdefault(txt_path, []).append(doc)
+            
+            # Create chunks for all documents in one pass
+            nodes_by_path = {}
+            for node in self.chunker.get_nodes_from_documents(documents):
+                nodes_by_path.setdefault(doc_paths[node.ref_doc_id], []).append(node)
+            
+        except Exception as e:
+            # Redo the files one by one so only the file that fails is reported
+            print(f"Warning: Batch chunking failed, chunking files individually: {e}")
+            results = {}
+            for txt_path, doc_metadata, _ in files.values():
+                chunked = self.chunk_document(txt_path, os.path.basename(txt_path), doc_metadata)
+                if chunked is not None:
+                    results[txt_path] = chunked
+            return results
+        
+        results = {}
+        for txt_path, _, _ in files.values():
+            if txt_path not in nodes_by_path:
+                self.logger.log_chunking_error(os.path.basename(txt_path), txt_path, "No chunks created from file")
+                continue
+            results[txt_path] = (nodes_by_path[txt_path], self._text_stats(docs_by_path[txt_path]))
+        
+        return results
+    
     def print_sample_nodes(self, nodes: List[BaseNode], sample_size: int = None):
         """Print sample of nodes for debugging"""
         if sample_size is None:
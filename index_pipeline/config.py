@@ -1,6 +1,7 @@
 # config.py
 
 import os
+from datetime import datetime
 from pathlib import Path
 
 class Config:
@@ -20,9 +21,28 @@ class Config:
     # ChromaDB settings
     COLLECTION_NAME = "document_collection"
     CHROMA_METADATA = {"hnsw:space": "cosine"}
+    CHROMA_BATCH_SIZE = 200
     
+    # Run Chroma as a separate `chroma run` server so slab inserts overlap with
+    # embedding (requires chromadb >= 0.5 for AsyncHttpClient)
+    CHROMA_SERVER_MODE = False
+    CHROMA_SERVER_HOST = "localhost"
+    CHROMA_SERVER_PORT = 8100  # Keeps 8000 free for the search endpoint
+    CHROMA_SERVER_STARTUP_TIMEOUT = 30  # seconds
+    CHROMA_MAX_CONCURRENT_INSERTS = 4
+
     # Embedding model
     EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBED_DEVICE = None  # None picks CUDA when available, else CPU
+    EMBED_BATCH_SIZE = 128
+    EMBED_DTYPE = "float16"  # Only applied on CUDA devices
+    EMBED_LENGTH_BUCKETS = [16, 32, 64, 128, 256, 512]  # Approximate token lengths
+    
+    # ONNX Runtime backend for CPU embedding (files ship with the model on the HF hub)
+    USE_ONNX = True
+    ONNX_QUANTIZE = True
+    ONNX_MODEL_FILE = "onnx/model.onnx"
+    ONNX_QUANTIZED_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
     
     # Chunking settings
     CHUNK_SIZE = 512
@@ -34,11 +54,38 @@ class Config:
     
     # Processing settings
     MAX_SAMPLE_PRINT = 3
+    PROCESSING_WORKERS = os.cpu_count() or 1
+    READER_WORKERS = min(8, os.cpu_count() or 1)  # Parallel loading of converted text files
     OCR_DPI = 300
+    PDF_PAGE_WORKERS = os.cpu_count() or 1
+    PDF_PARALLEL_MIN_PAGES = 8  # Smaller PDFs are not worth a process pool
+    
+    # OCR results cached by image content hash (in-memory LRU + SQLite file)
+    OCR_CACHE_ENABLED = True
+    OCR_CACHE_PATH = "../ocr_cache/ocr_cache.sqlite"
+    OCR_CACHE_SIZE = 4096  # In-memory entries per process
+    
+    # Skip image OCR on PDF pages whose text layer already has this many words,
+    # and images smaller than this many pixels (icons, bullets, rules)
+    OCR_TEXT_SKIP_THRESHOLD = 30
+    OCR_MIN_IMAGE_AREA = 100 * 100
+    
+    # Images are downscaled and binarized before OCR; Tesseract engine and page segmentation modes
+    OCR_MAX_DIMENSION = 1600
+    OCR_BINARIZE_THRESHOLD = 155
+    OCR_OEM = 1  # LSTM only
+    OCR_PSM = 6  # Single uniform block of text
     
     # Tesseract path (adjust for your system)
     TESSERACT_CMD = r'/usr/bin/tesseract'
     
+    # OCR in-process through tesserocr when it is installed (model loads once per process)
+    USE_TESSEROCR = True
+    TESSDATA_DIR = None  # None uses tesserocr's default tessdata location
+    
+    # Shared by every log file of one pipeline run; set by create_directories()
+    RUN_TIMESTAMP = None
+    
     @classmethod
     def create_directories(cls):
         """Create necessary directories if they don't exist"""
@@ -50,14 +97,17 @@ class Config:
         
         for directory in directories:
             Path(directory).mkdir(parents=True, exist_ok=True)
+        
+        cls.RUN_TIMESTAMP = cls.get_timestamp()
     
     @classmethod
     def get_log_file_path(cls, log_type="main"):
         """Get the path for log files"""
-        return os.path.join(cls.LOGS_DIR, f"{log_type}_{Config.get_timestamp()}.json")
+        if cls.RUN_TIMESTAMP is None:
+            cls.RUN_TIMESTAMP = cls.get_timestamp()
+        return os.path.join(cls.LOGS_DIR, f"{log_type}_{cls.RUN_TIMESTAMP}.json")
     
     @staticmethod
     def get_timestamp():
         """Get current timestamp for file naming"""
-        from datetime import datetime
         return datetime.now().strftime("%Y%m%d_%H%M%S")
\ No newline at end of file
@@ -3,12 +3,17 @@
 import os
 import time
 import shutil
-from typing import List, Optional
-from llama_index.core import VectorStoreIndex, StorageContext
-from llama_index.core.schema import BaseNode
+import asyncio
+import subprocess
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
+import torch
 
 from config import Config
 from logger import JSONLogger
@@ -18,9 +23,36 @@ class VectorIndexer:
     
     def __init__(self, logger: JSONLogger):
         self.logger = logger
-        self.embed_model = HuggingFaceEmbedding(model_name=Config.EMBED_MODEL_NAME)
+        # Resolved here so importing config does not pull in torch
+        device = Config.EMBED_DEVICE or ("cuda" if torch.cuda.is_available() else "cpu")
+        
+        # On CPU, run the model through ONNX Runtime (optionally INT8-quantized)
+        backend_kwargs = {}
+        if device == "cpu" and Config.USE_ONNX:
+            backend_kwargs = {
+                "backend": "onnx",
+                "model_kwargs": {
+                    "file_name": Config.ONNX_QUANTIZED_MODEL_FILE if Config.ONNX_QUANTIZE else Config.ONNX_MODEL_FILE
+                }
+            }
+        
+        self.embed_model = HuggingFaceEmbedding(
+            model_name=Config.EMBED_MODEL_NAME,
+            embed_batch_size=Config.EMBED_BATCH_SIZE,
+            device=device,
+            **backend_kwargs
+        )
+        
+        # Run the underlying SentenceTransformer in half precision on GPU
+        if device == "cuda" and Config.EMBED_DTYPE == "float16":
+            try:
+                self.embed_model._model.half()
+            except Exception as e:
+                print(f"Warning: Could not switch embedding model to float16: {e}")
+        
         self.vector_store = None
         self.index = None
+        self._chroma_server = None
     
     def setup_chroma_store(self, clear_existing: bool = False) -> bool:
         """
@@ -47,10 +79,13 @@ class VectorIndexer:
             
             # Initialize Chroma client
             try:
-                chroma_client = chromadb.PersistentClient(
-                    path=Config.PERSIST_DIR,
-                    settings=chromadb.Settings(anonymized_telemetry=False)
-                )
+                if Config.CHROMA_SERVER_MODE:
+                    chroma_client = self._start_chroma_server()
+                else:
+                    chroma_client = chromadb.PersistentClient(
+                        path=Config.PERSIST_DIR,
+                        settings=chromadb.Settings(anonymized_telemetry=False)
+                    )
             except Exception as e:
                 print(f"Error creating Chroma client: {e}")
                 return False
@@ -86,6 +121,47 @@ class VectorIndexer:
             print(f"ChromaDB setup error details: {e}")
             return False
     
+    def _start_chroma_server(self):
+        """Launch `chroma run` on PERSIST_DIR and return an HttpClient once it answers"""
+        self._chroma_server = subprocess.Popen(
+            [
+                "chroma", "run",
+                "--path", Config.PERSIST_DIR,
+                "--host", Config.CHROMA_SERVER_HOST,
+                "--port", str(Config.CHROMA_SERVER_PORT)
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        
+        deadline = time.monotonic() + Config.CHROMA_SERVER_STARTUP_TIMEOUT
+        while True:
+            try:
+                chroma_client = chromadb.HttpClient(
+                    host=Config.CHROMA_SERVER_HOST,
+                    port=Config.CHROMA_SERVER_PORT,
+                    settings=chromadb.Settings(anonymized_telemetry=False)
+                )
+                chroma_client.heartbeat()
+                print(f"Chroma server running on {Config.CHROMA_SERVER_HOST}:{Config.CHROMA_SERVER_PORT}")
+                return chroma_client
+            except Exception:
+                if self._chroma_server.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("Chroma server did not start")
+                time.sleep(0.5)
+    
+    def close(self):
+        """Stop the Chroma server started in server mode, if any"""
+        if self._chroma_server is None:
+            return
+        self._chroma_server.terminate()
+        try:
+            self._chroma_server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._chroma_server.kill()
+        self._chroma_server = None
+    
     def build_index(self, nodes: List[BaseNode], total_files: int) -> Optional[VectorStoreIndex]:
         """
         Build vector index from document nodes
@@ -103,17 +179,19 @@ class VectorIndexer:
         
         
         try:
-            # Setup storage context
-            storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
-            
             # Build index
             start_time = time.time()
             
-            self.index = VectorStoreIndex(
-                nodes=nodes,
-                embed_model=self.embed_model,
-                storage_context=storage_context,
-                show_progress=True
+            # Bulk-load straight into Chroma instead of going through VectorStoreIndex
+            if Config.CHROMA_SERVER_MODE:
+                asyncio.run(self._embed_and_insert_async(nodes))
+            else:
+                self._embed_nodes(nodes)
+                self._add_nodes_to_chroma(nodes)
+            
+            self.index = VectorStoreIndex.from_vector_store(
+                vector_store=self.vector_store,
+                embed_model=self.embed_model
             )
             
             elapsed_time = time.time() - start_time
@@ -133,6 +211,94 @@ class VectorIndexer:
             self.logger.log_indexing_error(str(e))
             return None
     
+    def _bucket_nodes(self, nodes: List[BaseNode]) -> List[List[Tuple[BaseNode, str]]]:
+        """Group nodes by approximate token length to minimize padding, shortest first"""
+        buckets = Config.EMBED_LENGTH_BUCKETS
+        bucketed = {}
+        for node in nodes:
+            text = node.get_content(metadata_mode=MetadataMode.EMBED)
+            # ~4 characters per token is a cheap proxy for tokenizing every chunk
+            bucket = min(bisect_left(buckets, len(text) // 4), len(buckets) - 1)
+            bucketed.setdefault(bucket, []).append((node, text))
+        return [bucketed[bucket] for bucket in sorted(bucketed)]
+    
+    def _encode_bucket(self, entries: List[Tuple[BaseNode, str]]) -> torch.Tensor:
+        """Encode one length bucket, leaving the embeddings on the model's device"""
+        return self.embed_model._model.encode(
+            [text for _, text in entries],
+            batch_size=Config.EMBED_BATCH_SIZE,
+            convert_to_tensor=True,
+            normalize_embeddings=self.embed_model.normalize,
+            show_progress_bar=False
+        )
+    
+    def _embed_nodes(self, nodes: List[BaseNode]):
+        """Embed nodes bucketed by approximate token length to minimize padding"""
+        embedded_nodes = []
+        bucket_embeddings = []
+        for entries in self._bucket_nodes(nodes):
+            # Tensors stay on the embedding device until every bucket is done
+            bucket_embeddings.append(self._encode_bucket(entries))
+            embedded_nodes.extend(node for node, _ in entries)
+        
+        # Single device-to-host copy for the whole corpus
+        embeddings = torch.cat(bucket_embeddings).float().cpu().numpy()
+        for node, embedding in zip(embedded_nodes, embeddings):
+            node.embedding = embedding.tolist()
+    
+    def _embed_bucket(self, entries: List[Tuple[BaseNode, str]]) -> List[BaseNode]:
+        """Embed one length bucket and attach the vectors to its nodes"""
+        embeddings = self._encode_bucket(entries).float().cpu().numpy()
+        bucket_nodes = [node for node, _ in entries]
+        for node, embedding in zip(bucket_nodes, embeddings):
+            node.embedding = embedding.tolist()
+        return bucket_nodes
+    
+    def _chroma_records(self, batch: List[BaseNode]) -> dict:
+        """Build collection.add arguments in the row layout ChromaVectorStore.add writes"""
+        metadatas = []
+        for node in batch:
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+            metadatas.append({key: "" if value is None else value for key, value in metadata.items()})
+        
+        return {
+            "ids": [node.node_id for node in batch],
+            "embeddings": [node.embedding for node in batch],
+            "documents": [node.get_content(metadata_mode=MetadataMode.NONE) for node in batch],
+            "metadatas": metadatas
+        }
+    
+    def _add_nodes_to_chroma(self, nodes: List[BaseNode]):
+        """Insert embedded nodes into the Chroma collection in large batches"""
+        collection = self.vector_store._collection
+        for start in range(0, len(nodes), Config.CHROMA_BATCH_SIZE):
+            collection.add(**self._chroma_records(nodes[start:start + Config.CHROMA_BATCH_SIZE]))
+    
+    async def _embed_and_insert_async(self, nodes: List[BaseNode]):
+        """Embed bucket by bucket while earlier slabs are written to the Chroma server"""
+        client = await chromadb.AsyncHttpClient(
+            host=Config.CHROMA_SERVER_HOST,
+            port=Config.CHROMA_SERVER_PORT,
+            settings=chromadb.Settings(anonymized_telemetry=False)
+        )
+        collection = await client.get_collection(Config.COLLECTION_NAME)
+        semaphore = asyncio.Semaphore(Config.CHROMA_MAX_CONCURRENT_INSERTS)
+        
+        async def _insert_slab(slab: List[BaseNode]):
+            async with semaphore:
+                await collection.add(**self._chroma_records(slab))
+        
+        loop = asyncio.get_running_loop()
+        inserts = []
+        for entries in self._bucket_nodes(nodes):
+            # Embedding runs on an executor thread so pending inserts keep flowing
+            bucket_nodes = await loop.run_in_executor(None, self._embed_bucket, entries)
+            for start in range(0, len(bucket_nodes), Config.CHROMA_BATCH_SIZE):
+                slab = bucket_nodes[start:start + Config.CHROMA_BATCH_SIZE]
+                inserts.append(asyncio.create_task(_insert_slab(slab)))
+        
+        await asyncio.gather(*inserts)
+    
     def print_vector_store_samples(self, sample_size: int = None):
         """Print samples from the vector store for debugging"""
         if sample_size is None:
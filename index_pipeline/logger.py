@@ -1,11 +1,18 @@
 # logger.py
 
-import json
 import logging
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 from pathlib import Path
+import orjson
+
+class _BufferedFileHandler(logging.FileHandler):
+    """FileHandler backed by a large write buffer instead of flushing every entry"""
+    
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=1 << 20,
+                    encoding=self.encoding, errors=self.errors)
 
 class JSONLogger:
     """Custom JSON logger for document processing"""
@@ -18,8 +25,8 @@ class JSONLogger:
         # Ensure log directory exists
         Path(log_file_path).parent.mkdir(parents=True, exist_ok=True)
         
-        # Create file handler
-        handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8')
+        # Create buffered file handler (flushed in log_summary, flush() and at interpreter exit)
+        handler = _BufferedFileHandler(log_file_path, mode='a', encoding='utf-8')
         handler.setLevel(logging.INFO)
         
         # Remove default formatting - we'll handle JSON formatting manually
@@ -157,15 +164,20 @@ class JSONLogger:
             success_rate=f"{(successful_files/total_files)*100:.1f}%" if total_files > 0 else "0%"
         )
         self._write_json_log(log_entry)
+        self.flush()
+    
+    def flush(self):
+        """Flush buffered log entries to disk"""
+        for handler in self.logger.handlers:
+            handler.flush()
     
     def _write_json_log(self, log_entry: Dict[str, Any]):
         """Write JSON log entry to file"""
         try:
-            json_line = json.dumps(log_entry, ensure_ascii=False, default=str)
+            json_line = orjson.dumps(log_entry, default=str).decode()
             # Get the file handler (first handler is file, second is console)
             file_handler = self.logger.handlers[0]
             file_handler.stream.write(json_line + '\n')
-            file_handler.stream.flush()
         except Exception as e:
             self.logger.error(f"Failed to write log entry: {e}")
 
@@ -1,8 +1,9 @@
 import os
 import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-import uuid
+from typing import List, Optional, Tuple
 
 from config import Config
 from logger import JSONLogger
@@ -10,6 +11,33 @@ from preprocess import DocumentProcessor
 from chunker import DocumentChunker
 from indexer import VectorIndexer
 
+# Per-process logger and document processor used by pool workers (created in _init_worker)
+_worker_logger = None
+_worker_processor = None
+
+def _init_worker(log_file_path: str, page_workers: int):
+    """Create the logger and processor once per worker process"""
+    global _worker_logger, _worker_processor
+    _worker_logger = JSONLogger(log_file_path, "local_file_indexing_worker")
+    _worker_processor = DocumentProcessor(_worker_logger, page_workers=page_workers)
+
+def preprocess_file(file_path: str) -> Tuple[str, Optional[str]]:
+    """
+    Convert a single file to text inside a pool worker
+    
+    Args:
+        file_path: Path to the raw file
+        
+    Returns:
+        Tuple of (file_path, output text path or None on failure)
+    """
+    txt_path = _worker_processor.process_file(file_path, Config.DOCS_FOLDER)
+    
+    # Pool workers exit without running exit handlers, so flush after every file
+    _worker_logger.flush()
+    
+    return file_path, txt_path
+
 class LocalFileIndexingPipeline:
     def __init__(self, clear_existing: bool = False):
         """Initialize pipeline
@@ -27,8 +55,7 @@ class LocalFileIndexingPipeline:
         log_file_path = Config.get_log_file_path("indexing_pipeline")
         self.logger = JSONLogger(log_file_path, "local_file_indexing_pipeline")
         
-        # Initialize components
-        self.processor = DocumentProcessor(self.logger)
+        # Initialize components (file conversion runs in worker processes)
         self.chunker = DocumentChunker(self.logger)
         self.indexer = VectorIndexer(self.logger)
 
@@ -44,7 +71,8 @@ class LocalFileIndexingPipeline:
     }
         
         # File tracking
-        self.processed_files = set()
+        self.processed_files = frozenset()
+        self._pending_processed = []
         self.clear_existing = clear_existing
         if not clear_existing:
             self._load_processed_files()
@@ -53,17 +81,27 @@ class LocalFileIndexingPipeline:
         """Load set of already processed files"""
         try:
             if os.path.exists(Config.PROCESSED_FILES_LOG):
-                with open(Config.PROCESSED_FILES_LOG, 'r') as f:
-                    self.processed_files = set(line.strip() for line in f if line.strip())
+                with open(Config.PROCESSED_FILES_LOG, 'rb') as f:
+                    data = f.read()
+                # One bulk read and byte-level split instead of iterating text lines
+                self.processed_files = frozenset(
+                    line.decode() for line in (raw.strip() for raw in data.split(b'\n')) if line
+                )
         except Exception as e:
             print(f"Warning: Could not load processed files log: {e}")
 
     def _save_processed_file(self, file_path: str):
-        """Mark a file as processed"""
-        self.processed_files.add(file_path)
+        """Mark a file as processed (written to the log by _flush_processed_files)"""
+        self._pending_processed.append(file_path)
+
+    def _flush_processed_files(self):
+        """Append all pending processed files to the log in a single write"""
+        if not self._pending_processed:
+            return
         try:
-            with open(Config.PROCESSED_FILES_LOG, 'a') as f:
-                f.write(f"{file_path}\n")
+            with open(Config.PROCESSED_FILES_LOG, 'a', buffering=1 << 16) as f:
+                f.write("\n".join(self._pending_processed) + "\n")
+            self._pending_processed.clear()
         except Exception as e:
             print(f"Warning: Could not update processed files log: {e}")
 
@@ -81,23 +119,103 @@ class LocalFileIndexingPipeline:
             # Process files
             print("\nProcessing files from local folder...")
             raw_files = self._get_raw_files()
-            
-            for i, file_path in enumerate(raw_files):
+            files_to_process = []
+            for file_path in raw_files:
                 if not self.clear_existing and file_path in self.processed_files:
                     print(f"Skipping already processed file: {os.path.basename(file_path)}")
                     continue
+                files_to_process.append(file_path)
+            
+            self.stats["total_files"] = len(files_to_process)
+            converted_files = []
+            
+            # Convert legacy .ppt files in one LibreOffice run instead of one per worker call
+            ppt_files = [file_path for file_path in files_to_process if file_path.lower().endswith(".ppt")]
+            if ppt_files:
+                print(f"\nConverting {len(ppt_files)} .ppt files...")
+                DocumentProcessor.convert_ppt_batch(ppt_files)
+            
+            # Convert files to text in parallel worker processes. Cores not taken
+            # by file workers are left for page-level PDF extraction, so page pools
+            # are only started when there are fewer files than cores.
+            file_workers = max(1, min(Config.PROCESSING_WORKERS, len(files_to_process)))
+            page_workers = max(1, Config.PDF_PAGE_WORKERS // file_workers)
+            # Spawned, not forked: this process already holds torch, tokenizer and Chroma
+            # threads and locks, which forked children would inherit mid-state. The spawned
+            # workers never start those, so their own page pools can fork safely.
+            with ProcessPoolExecutor(
+                max_workers=file_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.logger.log_file_path, page_workers)
+            ) as executor:
+                futures = {executor.submit(preprocess_file, file_path): file_path for file_path in files_to_process}
                 
-                self.stats["total_files"] += 1
-                filename = os.path.basename(file_path)
-                print(f"\nProcessing ({i+1}/{len(raw_files)}): {filename}")
-                
-                if self._process_and_index_file(file_path):
-                    self.stats["successful_files"] += 1
-                    self._save_processed_file(file_path)
-                else:
+                for i, future in enumerate(as_completed(futures)):
+                    file_path = futures[future]
+                    filename = os.path.basename(file_path)
+                    print(f"\nProcessed ({i+1}/{len(files_to_process)}): {filename}")
+                    
+                    # A crashing file (or worker) fails only itself, not the run
+                    try:
+                        _, txt_path = future.result()
+                    except Exception as e:
+                        self.logger.log_file_processing_error(
+                            filename, file_path, Path(file_path).suffix.lower(), str(e)
+                        )
+                        txt_path = None
+                    
+                    if not txt_path:
+                        print(f"Failed to process file: {filename}")
+                        self.stats["failed_files"] += 1
+                        continue
+                    
+                    converted_files.append((file_path, filename, txt_path))
+            
+            # Chunk all converted documents in a single batch
+            print(f"\nChunking {len(converted_files)} documents...")
+            chunked = self.chunker.chunk_documents_batch(
+                [txt_path for _, _, txt_path in converted_files],
+                [{} for _ in converted_files]
+            )
+            
+            all_nodes = []
+            pending_files = []
+            for file_path, filename, txt_path in converted_files:
+                if txt_path not in chunked:
+                    print(f"Failed to chunk file: {filename}")
                     self.stats["failed_files"] += 1
+                    continue
+                
+                # Text statistics come from the documents the chunker already loaded
+                nodes, text_stats = chunked[txt_path]
+                self.logger.log_file_complete(
+                    filename=filename,
+                    file_path=file_path,
+                    file_type=os.path.splitext(filename)[1],
+                    text_length=text_stats["text_length"],
+                    word_count=text_stats["word_count"],
+                    output_txt_path=txt_path,
+                    chunks_created=len(nodes),
+                    doc_ref_id=nodes[0].metadata["DOC_REF_ID"]
+                )
+                print(f"Successfully processed {filename} → {len(nodes)} chunks")
                 
-                time.sleep(0.1)
+                all_nodes.extend(nodes)
+                pending_files.append(file_path)
+            
+            # Index all chunks in a single batched build
+            if all_nodes:
+                print(f"\nIndexing {len(all_nodes)} chunks from {len(pending_files)} files...")
+                if self.indexer.build_index(all_nodes, len(pending_files)):
+                    self.stats["successful_files"] += len(pending_files)
+                    self.stats["total_chunks"] += len(all_nodes)
+                    for file_path in pending_files:
+                        self._save_processed_file(file_path)
+                    self._flush_processed_files()
+                else:
+                    print("Failed to build index")
+                    self.stats["failed_files"] += len(pending_files)
             
             # Step 3: Print results and summary
             self._print_results()
@@ -121,73 +239,21 @@ class LocalFileIndexingPipeline:
             self.logger.log_indexing_error(f"Pipeline failed: {str(e)}")
             print(f"Pipeline failed with error: {e}")
             return False
+        
+        finally:
+            self._flush_processed_files()
+            self.indexer.close()
     
     def _get_raw_files(self) -> List[str]:
         """Get list of raw files to process"""
         try:
-            files = []
-            for filename in os.listdir(Config.RAW_DOCS_FOLDER):
-                file_path = os.path.join(Config.RAW_DOCS_FOLDER, filename)
-                if os.path.isfile(file_path):
-                    files.append(file_path)
-            return files
+            # DirEntry caches file type from the directory read, avoiding a stat() per file
+            with os.scandir(Config.RAW_DOCS_FOLDER) as entries:
+                return [entry.path for entry in entries if entry.is_file()]
         except Exception as e:
             print(f"Error reading raw documents folder: {e}")
             return []
     
-    def _process_and_index_file(self, file_path: str) -> bool:
-        """
-        Process a single file through the complete pipeline and index its chunks
-        
-        Args:
-            file_path: Path to the raw file
-            
-        Returns:
-            True if file was successfully processed and indexed, False otherwise
-        """
-        filename = os.path.basename(file_path)
-        
-        # Step 1: Convert file to text
-        txt_path = self.processor.process_file(file_path, Config.DOCS_FOLDER)
-        if not txt_path:
-            print(f"Failed to process file: {filename}")
-            return False
-        
-        # Step 2: Chunk the text document
-        nodes = self.chunker.chunk_document(txt_path, filename, {})
-        if not nodes:
-            print(f"Failed to chunk file: {filename}")
-            return False
-        
-        # Step 3: Index the chunks
-        index = self.indexer.build_index(nodes, 1)  # We pass 1 for single file
-        if not index:
-            print(f"Failed to index file: {filename}")
-            return False
-        
-        # Update statistics
-        self.stats["total_chunks"] += len(nodes)
-        
-        # Log successful processing
-        with open(txt_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-            text_length = len(text)
-            word_count = len(text.split())
-
-        self.logger.log_file_complete(
-            filename=filename,
-            file_path=file_path,
-            file_type=os.path.splitext(filename)[1],
-            text_length=text_length,
-            word_count=word_count,
-            output_txt_path=txt_path,
-            chunks_created=len(nodes),
-            doc_ref_id=nodes[0].metadata["DOC_REF_ID"] if nodes else str(uuid.uuid4())
-        )
-        
-        print(f"Successfully processed and indexed {filename} → {len(nodes)} chunks")
-        return True
-    
     def _print_results(self):
         """Print pipeline results and statistics"""
         print(f"\n" + "="*60)
@@ -2,37 +2,422 @@
 
 import os
 import io
+import hashlib
+import mmap
+import sqlite3
+import subprocess
+import tempfile
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Tuple
 import fitz  #pymupdf
 from pptx import Presentation
-import docx
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from lxml import etree
 from PIL import Image
 import pytesseract
 import logging
 import re
 
+try:
+    from tesserocr import PyTessBaseAPI
+except ImportError:
+    PyTessBaseAPI = None
+
 from config import Config
 from logger import JSONLogger
 
 # Set tesseract path from config
 pytesseract.pytesseract.tesseract_cmd = Config.TESSERACT_CMD
 
+# Fast LSTM engine on a single uniform text block skips the legacy engine and page layout analysis
+_TESSERACT_CONFIG = f"--oem {Config.OCR_OEM} --psm {Config.OCR_PSM}"
+
+# Binarization lookup table applied with Image.point
+_BINARIZE_LUT = [0 if x < Config.OCR_BINARIZE_THRESHOLD else 255 for x in range(256)]
+
+# Keys the OCR cache digests so changing OCR settings does not reuse stale text
+_OCR_SETTINGS_KEY = hashlib.blake2b(
+    f"{_TESSERACT_CONFIG}|{Config.OCR_MAX_DIMENSION}|{Config.OCR_BINARIZE_THRESHOLD}".encode(),
+    digest_size=16
+).digest()
+
+# In-process Tesseract API (tesserocr), created lazily in each process
+_tess_api = None
+_tess_api_pid = None
+
+# WordprocessingML elements that carry paragraph text (None: take the element text)
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_TEXT_TAGS = {f"{_W_NS}t": None, f"{_W_NS}tab": "\t", f"{_W_NS}br": "\n", f"{_W_NS}cr": "\n"}
+# mc:AlternateContent repeats content (e.g. text boxes) in mc:Fallback for older readers
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+# Image files in a .pptx package that can be OCRed (vector formats like EMF are skipped)
+_PPTX_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff")
+
+# Runs of spaces, tabs and line breaks collapse to a single space
+_WHITESPACE_RUN_RE = re.compile(r'[ \t\r\n]+')
+
+def _tesseract_api():
+    """Return this process's tesserocr API, or None to fall back to the tesseract CLI"""
+    global _tess_api, _tess_api_pid
+    if PyTessBaseAPI is None or not Config.USE_TESSEROCR:
+        return None
+    
+    # An API inherited through fork() is not reused; the model loads once per process
+    if _tess_api_pid != os.getpid():
+        _tess_api_pid = os.getpid()
+        kwargs = {"lang": "eng", "oem": Config.OCR_OEM, "psm": Config.OCR_PSM}
+        if Config.TESSDATA_DIR:
+            kwargs["path"] = Config.TESSDATA_DIR
+        try:
+            _tess_api = PyTessBaseAPI(**kwargs)
+        except Exception as e:
+            logging.warning(f"tesserocr unavailable, using tesseract CLI: {str(e)}")
+            _tess_api = None
+    return _tess_api
+
+def _prep_for_ocr(img: Image.Image) -> Image.Image:
+    """Downscale and binarize an image so Tesseract has fewer, simpler pixels to process"""
+    if max(img.size) > Config.OCR_MAX_DIMENSION:
+        img.thumbnail((Config.OCR_MAX_DIMENSION, Config.OCR_MAX_DIMENSION), Image.BILINEAR)
+    return img.convert("L").point(_BINARIZE_LUT, "1")
+
+def _run_tesserocr(api, images: List[bytes]) -> List[Optional[str]]:
+    """OCR encoded images with the in-process Tesseract API"""
+    texts = []
+    for img_bytes in images:
+        try:
+            with Image.open(io.BytesIO(img_bytes)) as img:
+                api.SetImage(_prep_for_ocr(img))
+                texts.append(api.GetUTF8Text())
+        except Exception as e:
+            logging.warning(f"Image OCR failed: {str(e)}")
+            texts.append(None)
+    return texts
+
+def _run_tesseract_batch(images: List[bytes]) -> List[Optional[str]]:
+    """
+    OCR several encoded images with a single Tesseract invocation
+    
+    Tesseract reads a non-image input file as a list of image paths and ends
+    each image's text with a form feed. Falls back to one call per image if
+    the batch fails or its output cannot be split back up.
+    
+    Args:
+        images: List of encoded image bytes
+        
+    Returns:
+        OCR text for each image in input order, None where OCR failed
+    """
+    if not images:
+        return []
+    
+    api = _tesseract_api()
+    if api is not None:
+        return _run_tesserocr(api, images)
+    
+    texts = [None] * len(images)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Prepared images are written as uncompressed 1-bit PBM files
+        image_paths = {}
+        for i, img_bytes in enumerate(images):
+            try:
+                img_path = os.path.join(tmp_dir, f"{i}.pbm")
+                with Image.open(io.BytesIO(img_bytes)) as img:
+                    _prep_for_ocr(img).save(img_path)
+                image_paths[i] = img_path
+            except Exception as e:
+                logging.warning(f"Image decode failed: {str(e)}")
+        
+        if not image_paths:
+            return texts
+        
+        list_path = os.path.join(tmp_dir, "images.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(image_paths.values()) + "\n")
+        
+        try:
+            results = pytesseract.image_to_string(list_path, config=_TESSERACT_CONFIG).split("\f")
+            if len(results) == len(image_paths) + 1:
+                for i, text in zip(image_paths, results):
+                    texts[i] = text
+                return texts
+            logging.warning(f"Batched OCR returned {len(results) - 1} results for {len(image_paths)} images")
+        except Exception as e:
+            logging.warning(f"Batched OCR failed: {str(e)}")
+        
+        for i, img_path in image_paths.items():
+            try:
+                texts[i] = pytesseract.image_to_string(img_path, config=_TESSERACT_CONFIG)
+            except Exception as e:
+                logging.warning(f"Image OCR failed: {str(e)}")
+    
+    return texts
+
+class _OCRCache:
+    """Content-addressed OCR results: an in-memory LRU backed by a SQLite file"""
+    
+    def __init__(self, db_path: str, max_size: int):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._memory = OrderedDict()
+        self._conn = None
+        self._pid = None
+    
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite store, once per process since connections cannot cross fork()"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = None
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                # WAL lets worker processes read while another one writes
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS ocr_cache (digest BLOB PRIMARY KEY, text TEXT)")
+                self._conn = conn
+            except Exception as e:
+                logging.warning(f"OCR cache unavailable: {str(e)}")
+        return self._conn
+    
+    def _remember(self, digest: bytes, text: str):
+        self._memory[digest] = text
+        self._memory.move_to_end(digest)
+        if len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+    
+    def get(self, digest: bytes) -> Optional[str]:
+        """Return the cached text for an image digest, or None on a miss"""
+        text = self._memory.get(digest)
+        if text is not None:
+            self._memory.move_to_end(digest)
+            return text
+        
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT text FROM ocr_cache WHERE digest = ?", (digest,)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"OCR cache lookup failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        
+        self._remember(digest, row[0])
+        return row[0]
+    
+    def put_many(self, entries: Dict[bytes, str]):
+        """Store OCR text for several image digests"""
+        for digest, text in entries.items():
+            self._remember(digest, text)
+        
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO ocr_cache (digest, text) VALUES (?, ?)", entries.items())
+        except sqlite3.Error as e:
+            logging.warning(f"OCR cache write failed: {str(e)}")
+
+_ocr_cache = _OCRCache(Config.OCR_CACHE_PATH, Config.OCR_CACHE_SIZE)
+
+def _ocr_image_batch(images: List[bytes]) -> List[str]:
+    """
+    OCR encoded images, running Tesseract only on images not seen before
+    
+    Args:
+        images: List of encoded image bytes
+        
+    Returns:
+        OCR text for each image, in input order
+    """
+    if not Config.OCR_CACHE_ENABLED:
+        return [text or "" for text in _run_tesseract_batch(images)]
+    
+    # Logos and headers repeat across pages, so identical images are OCRed once
+    digests = [hashlib.blake2b(img_bytes, digest_size=16, key=_OCR_SETTINGS_KEY).digest() for img_bytes in images]
+    texts = [_ocr_cache.get(digest) for digest in digests]
+    
+    misses = {}
+    for i, (digest, text) in enumerate(zip(digests, texts)):
+        if text is None:
+            misses.setdefault(digest, []).append(i)
+    
+    if misses:
+        results = _run_tesseract_batch([images[indices[0]] for indices in misses.values()])
+        for indices, text in zip(misses.values(), results):
+            for i in indices:
+                texts[i] = text or ""
+        
+        # Failed OCR is not cached so it is retried on the next run
+        _ocr_cache.put_many({
+            digest: text for digest, text in zip(misses, results) if text is not None
+        })
+    
+    return texts
+
+def _pixmap_to_pnm(pix: fitz.Pixmap) -> bytes:
+    """
+    Serialize a pixmap as uncompressed PNM, which Tesseract and PIL read without zlib work
+    
+    Args:
+        pix: Pixmap of an embedded PDF image
+        
+    Returns:
+        PGM/PPM encoded image bytes
+    """
+    # PNM only holds grayscale or RGB samples without alpha
+    if pix.colorspace is not None and pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    return pix.tobytes("pnm")
+
+# Document opened by a page-pool worker and the image xrefs it has already OCRed
+# (each pool handles one document)
+_worker_doc = None
+_worker_seen_xrefs = None
+
+def _init_pdf_page_worker(path: str):
+    """Open the pool's document once per worker, with an empty set of seen image xrefs"""
+    global _worker_doc, _worker_seen_xrefs
+    _worker_doc = fitz.open(path)
+    _worker_seen_xrefs = set()
+
+def _extract_pdf_worker_page(page_num: int) -> Tuple[int, str]:
+    """Extract a page of the page-pool worker's document (pool task entry point)"""
+    return _extract_pdf_page(_worker_doc, page_num, _worker_seen_xrefs)
+
+def _extract_pdf_page(doc: fitz.Document, page_num: int, seen_xrefs: Set[int]) -> Tuple[int, str]:
+    """
+    Extract the text layer and OCR the images of a single PDF page
+    
+    Args:
+        doc: Open PDF document
+        page_num: Zero-based page index
+        seen_xrefs: Image xrefs already OCRed for this document; updated in place
+        
+    Returns:
+        Tuple of (page_num, page text)
+    """
+    text = []
+    page = doc[page_num]
+    
+    # Extract text directly from PDF
+    page_text = page.get_text()
+    if page_text.strip():
+        text.append(page_text)
+    
+    # Born-digital pages with a real text layer only carry logos and decoration in images
+    if len(page_text.split()) >= Config.OCR_TEXT_SKIP_THRESHOLD:
+        return page_num, "\n".join(text)
+    
+    # Extract text from images using OCR, one Tesseract run per page
+    images = []
+    for img in page.get_images():
+        try:
+            # get_images() reports the stored size, so tiny icons are skipped before decoding
+            xref, width, height, img_filter = img[0], img[2], img[3], img[8]
+            if width * height < Config.OCR_MIN_IMAGE_AREA:
+                continue
+            
+            # Headers and logos reference one xref from every page; OCR it once
+            if xref in seen_xrefs:
+                continue
+            seen_xrefs.add(xref)
+            
+            # JPEGs go to OCR as their stored stream (decoded once by PIL's
+            # libjpeg path); other encodings are decoded by MuPDF into raw PNM
+            if img_filter == "DCTDecode":
+                images.append(doc.extract_image(xref)["image"])
+            else:
+                images.append(_pixmap_to_pnm(fitz.Pixmap(doc, xref)))
+        except Exception as img_e:
+            logging.warning(f"Image extraction failed on page {page_num}: {str(img_e)}")
+            continue
+
+    text.extend(ocr_text for ocr_text in _ocr_image_batch(images) if ocr_text.strip())
+    return page_num, "\n".join(text)
+
+class _MappedFile(mmap.mmap):
+    """Read-only file mapping usable as a zipfile source (mmap has no seekable() before 3.13)"""
+    
+    def seekable(self) -> bool:
+        return True
+
+@contextmanager
+def _mapped_zip(path: str):
+    """
+    Open a zip package (e.g. .docx) over a read-only memory map of the file
+    
+    zipfile's many small seek/read calls become memory copies, and the kernel
+    pages the file in on demand instead of it being read through Python buffers.
+    """
+    with open(path, 'rb') as fh, \
+            _MappedFile(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+            zipfile.ZipFile(mapped) as archive:
+        yield archive
+
+def _converted_pptx_path(ppt_path: str) -> str:
+    """Path LibreOffice writes a .ppt's conversion to (same folder, .pptx extension)"""
+    return os.path.splitext(ppt_path)[0] + ".pptx"
+
 class DocumentProcessor:
     """Handles document processing with comprehensive logging"""
     
-    def __init__(self, logger: JSONLogger):
+    def __init__(self, logger: JSONLogger, page_workers: Optional[int] = None):
+        """
+        Args:
+            logger: Logger for processing errors
+            page_workers: Processes used to extract large PDFs page by page
+                (defaults to Config.PDF_PAGE_WORKERS)
+        """
         self.logger = logger
+        self.page_workers = page_workers if page_workers is not None else Config.PDF_PAGE_WORKERS
     
     def _clean_text(self, text: str) -> str:
         """Clean text by removing excessive newlines and whitespace"""
-        # Normalize line breaks
-        text = text.replace('\r\n', '\n').replace('\r', ' ')
-        # Replace multiple newlines with single space
-        text = re.sub(r'\n+', ' ', text)
-        # Remove extra whitespace
-        text = re.sub(r'[ \t]+', ' ', text).strip()
-        return text
+        return _WHITESPACE_RUN_RE.sub(' ', text).strip()
+    
+    @staticmethod
+    def convert_ppt_batch(paths: List[str]) -> Dict[str, str]:
+        """
+        Convert legacy .ppt files to .pptx with one LibreOffice run per folder
+        
+        LibreOffice takes several seconds to start, so converting a batch up front
+        replaces one cold start per file in process_file.
+        
+        Args:
+            paths: Paths to .ppt files
+            
+        Returns:
+            Mapping of each converted .ppt path to its .pptx path
+        """
+        by_dir = {}
+        for path in paths:
+            by_dir.setdefault(os.path.dirname(path) or ".", []).append(path)
+        
+        converted = {}
+        for out_dir, dir_paths in by_dir.items():
+            try:
+                subprocess.run(["libreoffice", "--headless", "--convert-to", "pptx", *dir_paths, "--outdir", out_dir], check=True)
+            except Exception as e:
+                logging.warning(f"Batch .ppt conversion failed in {out_dir}: {str(e)}")
+            
+            # A failed run may still have converted some files
+            for path in dir_paths:
+                converted_path = _converted_pptx_path(path)
+                if os.path.exists(converted_path):
+                    converted[path] = converted_path
+        
+        return converted
     
     def process_file(self, filepath: str, output_dir: str = None) -> Optional[str]:
         """
@@ -47,12 +432,6 @@ class DocumentProcessor:
         """
         MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
     
-        file_size = os.path.getsize(filepath)
-        if file_size > MAX_FILE_SIZE:
-            error_msg = f"File too large ({file_size} bytes)"
-            self.logger.log_file_processing_error(filename, str(filepath), file_ext, error_msg)
-            return None
-    
         if output_dir is None:
             output_dir = Config.DOCS_FOLDER
             
@@ -61,18 +440,36 @@ class DocumentProcessor:
         filename = file_path.name
         file_stem = file_path.stem
         file_ext = file_path.suffix.lower()
+        
+        file_size = os.path.getsize(filepath)
+        if file_size > MAX_FILE_SIZE:
+            error_msg = f"File too large ({file_size} bytes)"
+            self.logger.log_file_processing_error(filename, str(filepath), file_ext, error_msg)
+            return None
+        
         output_txt = os.path.join(output_dir, f"{file_stem}.txt")
         
         try:
             # Process based on file type
             if file_ext == ".pdf":
-                text = self._extract_pdf_text(filepath)
+                # Pages are cleaned and written as they are extracted, so the
+                # whole document is never held in memory
+                try:
+                    with open(output_txt, 'w', encoding='utf-8', buffering=1 << 20) as out_fh:
+                        self._extract_pdf_text(filepath, out_fh)
+                except Exception:
+                    if os.path.exists(output_txt):
+                        os.remove(output_txt)
+                    raise
+                return output_txt
             elif file_ext in [".pptx", ".ppt"]:
                 if file_ext == ".ppt":
                     try:
-                        from subprocess import run
-                        converted_path = filepath.replace(".ppt", ".pptx")
-                        run(["libreoffice", "--headless", "--convert-to", "pptx", filepath, "--outdir", os.path.dirname(filepath)], check=True)
+                        converted_path = _converted_pptx_path(filepath)
+                        # Reuse the output of convert_ppt_batch when it is up to date
+                        if not (os.path.exists(converted_path)
+                                and os.path.getmtime(converted_path) >= os.path.getmtime(filepath)):
+                            subprocess.run(["libreoffice", "--headless", "--convert-to", "pptx", filepath, "--outdir", os.path.dirname(filepath) or "."], check=True)
                         filepath = converted_path  # Use converted pptx
                         file_ext = ".pptx"
                         filename = Path(filepath).name
@@ -95,13 +492,10 @@ class DocumentProcessor:
             
             text = self._clean_text(text)
             
-            # Calculate text statistics
-            text_length = len(text)
-            word_count = len(text.split()) if text else 0
-            
-            # Write processed text to file
-            with open(output_txt, 'w', encoding='utf-8') as f:
-                f.write(text)
+            # Write processed text to file as one encoded buffer (text statistics
+            # are computed by the chunker when it loads the file)
+            with open(output_txt, 'wb') as f:
+                f.write(text.encode('utf-8'))
             
             return output_txt
             
@@ -109,81 +503,129 @@ class DocumentProcessor:
             self.logger.log_file_processing_error(filename, str(filepath), file_ext, str(e))
             return None
     
-    def _extract_pdf_text(self, path: str) -> str:
-        """Extract text from PDF file using pymupdf with OCR fallback"""
-        text = []
+    def _extract_pdf_text(self, path: str, out_fh: TextIO):
+        """
+        Extract text from PDF file using pymupdf with OCR fallback
         
+        Args:
+            path: Path to the PDF file
+            out_fh: Text file the cleaned pages are written to
+        """
         try:
-            doc = fitz.open(path)
-            
-            for page in doc:
-                # Extract text directly from PDF
-                page_text = page.get_text()
-                if page_text.strip():
-                    text.append(page_text)
+            with fitz.open(path) as doc:
+                page_count = doc.page_count
                 
-                # Extract text from images using OCR
-                for img in page.get_images():
-                    try:
-                        xref = img[0]
-                        pix = fitz.Pixmap(doc, xref)
-                        img_bytes = pix.tobytes("png")
-                        img_pil = Image.open(io.BytesIO(img_bytes))
-                        ocr_text = pytesseract.image_to_string(img_pil)
-                        if ocr_text.strip():
-                            text.append(ocr_text)
-                    except Exception as img_e:
-                        logging.warning(f"Image OCR failed on page {page.number}: {str(img_e)}")
-                        continue
-            
-            return "\n".join(text)
+                # map() yields pages in order, each as soon as it and its predecessors are done
+                if self.page_workers > 1 and page_count >= Config.PDF_PARALLEL_MIN_PAGES:
+                    # OCR is CPU-bound, so pages go to separate processes, each opening the
+                    # document once. Repeated images split across workers are caught by the OCR cache.
+                    with ProcessPoolExecutor(
+                        max_workers=min(self.page_workers, page_count),
+                        initializer=_init_pdf_page_worker,
+                        initargs=(path,)
+                    ) as executor:
+                        self._write_pages(executor.map(_extract_pdf_worker_page, range(page_count)), out_fh)
+                else:
+                    extract_page = partial(_extract_pdf_page, doc, seen_xrefs=set())
+                    self._write_pages(map(extract_page, range(page_count)), out_fh)
             
         except Exception as e:
             logging.error(f"PDF processing failed: {str(e)}")
             raise
     
+    def _write_pages(self, pages: Iterable[Tuple[int, str]], out_fh: TextIO):
+        """Clean and write page texts, space-separated as whole-document cleaning would leave them"""
+        separator = ""
+        for _, page_text in pages:
+            page_text = self._clean_text(page_text)
+            if page_text:
+                out_fh.write(separator)
+                out_fh.write(page_text)
+                separator = " "
+    
     def _extract_pptx_text(self, path: str) -> str:
         """Extract text from PowerPoint file"""
         prs = Presentation(path)
-        text = []
-        
+        slide_texts = []
+        images = []
+        image_slides = []
         for slide_num, slide in enumerate(prs.slides):
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    text.append(shape.text.strip())
-                
-                # Extract text from images using OCR
-                try:
-                    if shape.shape_type == 13:  # Picture shape type
-                        img_bytes = shape.image.blob
-                        with Image.open(io.BytesIO(img_bytes)) as img:
-                            img_text = pytesseract.image_to_string(img)
-                            if img_text.strip():
-                                text.append(img_text)
-                except Exception as e:
-                    logging.warning(f"Slide {slide_num + 1} image OCR failed: {str(e)}")
+            slide_texts.append([
+                shape.text.strip() for shape in slide.shapes if hasattr(shape, "text") and shape.text.strip()
+            ])
+            
+            # Images the slide itself references; master/layout backgrounds and unused
+            # media are skipped. Each image part is OCRed once per slide
+            try:
+                seen_parts = set()
+                for rel in slide.part.rels.values():
+                    if rel.is_external or rel.reltype != RT.IMAGE or not rel.target_ref.lower().endswith(_PPTX_IMAGE_EXTS):
+                        continue
+                    image_part = rel.target_part
+                    if image_part.partname in seen_parts:
+                        continue
+                    seen_parts.add(image_part.partname)
+                    images.append(image_part.blob)
+                    image_slides.append(slide_num)
+            except Exception as e:
+                logging.warning(f"Slide {slide_num + 1} image extraction failed: {str(e)}")
         
-        return "\n".join(text)
+        # OCR every slide image with one Tesseract run, keeping each text with its slide
+        for slide_num, img_text in zip(image_slides, _ocr_image_batch(images)):
+            if img_text.strip():
+                slide_texts[slide_num].append(img_text)
+        
+        return "\n".join(slide_text for texts in slide_texts for slide_text in texts)
     
     def _extract_docx_text(self, path: str) -> str:
-        """Extract text from Word document"""
-        doc = docx.Document(path)
-        return "\n".join(p.text.strip() for p in doc.paragraphs if p.text.strip())
+        """Extract text from Word document by streaming word/document.xml one paragraph at a time"""
+        text = []
+        with _mapped_zip(path) as archive, archive.open("word/document.xml") as f:
+            for _, paragraph in etree.iterparse(f, events=("end",), tag=f"{_W_NS}p"):
+                # Text boxes nest paragraphs; their text is read with the outermost one.
+                # Fallback copies of alternate content would duplicate it
+                if next(paragraph.iterancestors(f"{_W_NS}p", _MC_FALLBACK), None) is not None:
+                    continue
+                etree.strip_elements(paragraph, _MC_FALLBACK, with_tail=False)
+                
+                paragraph_text = "".join(
+                    (node.text or "") if _DOCX_TEXT_TAGS[node.tag] is None else _DOCX_TEXT_TAGS[node.tag]
+                    for node in paragraph.iter(*_DOCX_TEXT_TAGS)
+                ).strip()
+                if paragraph_text:
+                    text.append(paragraph_text)
+                
+                # Free the parsed subtree and the already-read siblings (tables, skipped
+                # fallbacks) so memory stays bounded by one paragraph
+                paragraph.clear()
+                while paragraph.getprevious() is not None:
+                    del paragraph.getparent()[0]
+        
+        return "\n".join(text)
     
     def _extract_image_text(self, path: str) -> str:
         """Extract text from image using OCR"""
         try:
-            image = Image.open(path)
-            return pytesseract.image_to_string(image)
+            image = _prep_for_ocr(Image.open(path))
+            api = _tesseract_api()
+            if api is not None:
+                api.SetImage(image)
+                return api.GetUTF8Text()
+            return pytesseract.image_to_string(image, config=_TESSERACT_CONFIG)
         except Exception as e:
             logging.error(f"Image OCR failed: {str(e)}")
             return ""
 
+# Shared processor behind the legacy process_file(), created on first use
+_DEFAULT_PROCESSOR = None
+
 # Legacy function for backward compatibility
 def process_file(filepath, output_dir="docs"):
-    """Legacy function - creates a temporary logger for single file processing"""
-    from datetime import datetime
-    log_path = f"temp_process_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    temp_logger = JSONLogger(log_path, "temp_processor")
-    processor = DocumentProcessor(temp_logger)
-    return processor.process_file(filepath, output_dir)
\ No newline at end of file
+    """Legacy function - processes a single file with a shared temporary logger"""
+    global _DEFAULT_PROCESSOR
+    if _DEFAULT_PROCESSOR is None:
+        _DEFAULT_PROCESSOR = DocumentProcessor(JSONLogger("temp_process.json", "temp_processor"))
+    
+    output_txt = _DEFAULT_PROCESSOR.process_file(filepath, output_dir)
+    _DEFAULT_PROCESSOR.logger.flush()
+    return output_txt
\ No newline at end of file
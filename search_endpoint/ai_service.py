@@ -1,9 +1,11 @@
+import asyncio
 import json
+import logging
 import time
-from typing import Dict, Any, Tuple , List
+from typing import Dict, Any, Optional, Tuple , List
 from fastapi import HTTPException
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 
 from settings import Settings as AppSettings
 from schemas import AIResponse , ChatMessage
@@ -13,98 +15,8 @@ from logging_utils import StructuredLogger
 #from llama_index.core.memory import ChatMemoryBuffer
 
 
-class AIService:
-    """AI service for generating responses using Gemini"""
-    
-    def __init__(self, logger: StructuredLogger):
-        self.logger = logger
-        self.client = None
-        self._initialize()
-    
-    def _initialize(self):
-        """Initialize Gemini client"""
-        try:
-            self.client = genai.Client(api_key=AppSettings.GEMINI_API_KEY)
-            self.logger.info("Gemini client initialized successfully")
-        except Exception as e:
-            self.logger.error("Failed to initialize Gemini client", e)
-            self.client = None
-    
-    def generate_response(self, user_query: str, context: str) -> Tuple[AIResponse, Dict[str, Any], Dict[str, Any]]:
-        """Generate structured response using Gemini with full logging"""
-        
-        if not self.client:
-            raise HTTPException(status_code=503, detail="Gemini service not initialized")
-
-        # Prepare input for logging
-        gemini_input = {
-            "model": AppSettings.GEMINI_MODEL,
-            "system_instruction": self._prepare_system_prompt(context, user_query),
-            "user_query": user_query,
-            "config": {
-                "temperature": AppSettings.GEMINI_TEMPERATURE,
-                "max_output_tokens": AppSettings.GEMINI_MAX_OUTPUT_TOKENS,
-                "top_p": AppSettings.GEMINI_TOP_P,
-                "top_k": AppSettings.GEMINI_TOP_K,
-                "response_mime_type": "application/json"
-            }
-        }
-
-        try:
-            # Make the structured API call
-            response = self.client.models.generate_content(
-                model=AppSettings.GEMINI_MODEL,
-                contents=[user_query],
-                config={
-                    "system_instruction": gemini_input["system_instruction"],
-                    "temperature": gemini_input["config"]["temperature"],
-                    "max_output_tokens": gemini_input["config"]["max_output_tokens"],
-                    "response_mime_type": "application/json",
-                    "response_schema": AIResponse,  # Enforce our schema
-                    "top_p": gemini_input["config"]["top_p"],
-                    "top_k": gemini_input["config"]["top_k"]
-                }
-            )
-
-            # Get both raw and parsed responses
-            raw_response = response.text
-            ai_response: AIResponse = response.parsed
-
-            # Prepare output for logging
-            gemini_output = {
-                "raw_response": raw_response,
-                "parsed_response": ai_response.dict(),
-                "duration": response.metadata.generation_time if hasattr(response, 'metadata') else None
-            }
-
-            self.logger.info("Gemini response generated successfully", {
-                "duration": gemini_output["duration"],
-                "answer_length": len(ai_response.answer),
-                "suggestions_count": len(ai_response.suggestions),
-                "confidence_score": ai_response.confidence_score
-            })
-
-            return ai_response, gemini_input, gemini_output
-
-        except Exception as e:
-            self.logger.error("Gemini call failed", e)
-            
-            # Prepare error response
-            error_response = AIResponse(
-                answer=f"Error processing your request: {str(e)}",
-                suggestions=["Please try again later", "Contact support if issue persists"],
-                was_context_valid=False,
-                confidence_score=0.0
-            )
-            
-            return error_response, gemini_input, {
-                "error": str(e),
-                "raw_response": getattr(response, 'text', '') if 'response' in locals() else None
-            }
-    
-    def _prepare_system_prompt(self, context: str, user_query: str) -> str:
-        """Prepare enhanced system prompt with complete metadata structure"""
-        return f"""You are an expert document analysis assistant. Answer the user's question using ONLY the provided context below.
+# Prompt templates, filled per request with str.format_map ({context} and {user_query})
+_SEARCH_PROMPT_INSTRUCTIONS = """You are an expert document analysis assistant. Answer the user's question using ONLY the provided context below.
 
             IMPORTANT INSTRUCTIONS:
             1. Each document chunk has inline metadata in [METADATA]...[/METADATA] blocks.
@@ -122,12 +34,9 @@ class AIService:
             3. Always prioritize content with a higher SCORE.
             4. When referencing documents in your answer, mention the PRESENTATION_LINK if helpful.
             5. Use the DOC_TITLE and PRESENTER_1_NAME   only if the answer truly requires deeper exploration.
-            6. When presenting suggestions, base them on what’s in context, not outside assumptions.
+            6. When presenting suggestions, base them on what’s in context, not outside assumptions."""
 
-            CONTEXT WITH INLINE METADATA:
-            {context}
-
-            RESPONSE FORMAT (JSON):
+_SEARCH_PROMPT_RESPONSE_FORMAT = """RESPONSE FORMAT (JSON):
             {{
                 "answer": "Comprehensive answer according to the context and inline metadata provided to you with source references using PRESENTATION_LINK",
                 "suggestions": [
@@ -137,17 +46,31 @@ class AIService:
                 ],
                 "was_context_valid": true/false (based on whether context fully answers the question),
                 "confidence_score": 0.0–1.0 (based on relevance scores and content quality)
-            }}
+            }}"""
+
+_SYSTEM_PROMPT_TMPL = (
+    _SEARCH_PROMPT_INSTRUCTIONS
+    + "\n\n            CONTEXT WITH INLINE METADATA:\n            {context}\n\n            "
+    + _SEARCH_PROMPT_RESPONSE_FORMAT
+    + "\n\n            USER QUESTION: {user_query}\n\n            Respond with ONLY the JSON object:"
+)
+
+# Search prompt split for Gemini context caching: the static instructions are
+# cached server-side and only the context and question are sent per request
+_CACHED_SYSTEM_INSTRUCTION = (
+    _SEARCH_PROMPT_INSTRUCTIONS
+    + "\n\n            The context and the user question are sent with each request.\n\n            "
+    + _SEARCH_PROMPT_RESPONSE_FORMAT.format_map({})
+)
+
+_CACHED_QUERY_TMPL = """CONTEXT WITH INLINE METADATA:
+{context}
 
-            USER QUESTION: {user_query}
+USER QUESTION: {user_query}
 
-            Respond with ONLY the JSON object:"""
+Respond with ONLY the JSON object:"""
 
-    
-    
-    def _prepare_system_prompt_chat(self, context: str, user_query: str) -> str:
-        """Prepare enhanced system prompt with complete metadata structure"""
-        return f"""You are an AI Knowledge Assistant* – friendly, helpful, and specialized in document and policy understanding.
+_CHAT_PROMPT_TMPL = """You are an AI Knowledge Assistant* – friendly, helpful, and specialized in document and policy understanding.
 
 Your responsibilities:
 - Help employees by answering questions using internal documents (PDFs, PPTs, training decks, etc.).
@@ -242,16 +165,214 @@ USER QUESTION: {user_query}
 Respond with ONLY the JSON object:
 """
 
-    def generate_chat_response(self, message_history: List[ChatMessage], current_question: str,
+
+# Generation settings shared by every Gemini call and logged as the request's "config"
+_GENERATION_SETTINGS = {
+    "temperature": AppSettings.GEMINI_TEMPERATURE,
+    "max_output_tokens": AppSettings.GEMINI_MAX_OUTPUT_TOKENS,
+    "top_p": AppSettings.GEMINI_TOP_P,
+    "top_k": AppSettings.GEMINI_TOP_K,
+    "response_mime_type": "application/json"
+}
+
+
+class AIService:
+    """AI service for generating responses using Gemini"""
+    
+    def __init__(self, logger: StructuredLogger):
+        self.logger = logger
+        self.client = None
+        self.aclient = None
+        
+        # Server-side cache of the static search instructions (created on first use)
+        self._prompt_cache_enabled = AppSettings.GEMINI_PROMPT_CACHE_ENABLED
+        self._prompt_cache_name = None
+        self._prompt_cache_refresh_at = 0.0
+        self._prompt_cache_expires_at = 0.0
+        self._prompt_cache_retry_at = 0.0
+        self._prompt_cache_size_checked = False
+        self._prompt_cache_lock = asyncio.Lock()
+        self._initialize()
+    
+    def _initialize(self):
+        """Initialize Gemini client"""
+        try:
+            self.client = genai.Client(api_key=AppSettings.GEMINI_API_KEY)
+            # Async interface so concurrent requests share the event loop while waiting on Gemini
+            self.aclient = self.client.aio
+            self.logger.info("Gemini client initialized successfully")
+        except Exception as e:
+            self.logger.error("Failed to initialize Gemini client", e)
+            self.client = None
+            self.aclient = None
+    
+    async def _get_prompt_cache(self) -> Optional[str]:
+        """Return the cached-content name for the search instructions, creating or refreshing it when due"""
+        if not self._prompt_cache_enabled:
+            return None
+        
+        now = time.monotonic()
+        if self._prompt_cache_name and now < self._prompt_cache_refresh_at:
+            return self._prompt_cache_name
+        if now < self._prompt_cache_retry_at or self._prompt_cache_lock.locked():
+            # A refresh is in flight or just failed: don't wait, use the current cache while it lasts
+            return self._current_prompt_cache()
+        
+        async with self._prompt_cache_lock:
+            try:
+                if not self._prompt_cache_size_checked:
+                    # Below the model's minimum cacheable size caches.create would just fail
+                    token_count = (await self.aclient.models.count_tokens(
+                        model=AppSettings.GEMINI_MODEL,
+                        contents=_CACHED_SYSTEM_INSTRUCTION
+                    )).total_tokens
+                    if token_count < AppSettings.GEMINI_PROMPT_CACHE_MIN_TOKENS:
+                        self.logger.info("Search instructions too short for Gemini prompt caching, sending full prompts", {
+                            "token_count": token_count,
+                            "min_tokens": AppSettings.GEMINI_PROMPT_CACHE_MIN_TOKENS
+                        })
+                        self._prompt_cache_enabled = False
+                        return None
+                    self._prompt_cache_size_checked = True
+                
+                cache = await self.aclient.caches.create(
+                    model=AppSettings.GEMINI_MODEL,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=_CACHED_SYSTEM_INSTRUCTION,
+                        ttl=f"{AppSettings.GEMINI_PROMPT_CACHE_TTL}s"
+                    )
+                )
+            except Exception as e:
+                # Likely transient: keep the current cache until it expires and try again later
+                self.logger.error("Could not create Gemini prompt cache, keeping the current one", e)
+                self._prompt_cache_retry_at = time.monotonic() + AppSettings.GEMINI_PROMPT_CACHE_RETRY_INTERVAL
+                return self._current_prompt_cache()
+            
+            created_at = time.monotonic()
+            self._prompt_cache_name = cache.name
+            self._prompt_cache_expires_at = created_at + AppSettings.GEMINI_PROMPT_CACHE_TTL
+            # Recreate a minute before expiry so requests never reference an expired cache
+            self._prompt_cache_refresh_at = self._prompt_cache_expires_at - 60
+            return self._prompt_cache_name
+    
+    def _current_prompt_cache(self) -> Optional[str]:
+        """The existing cache name if it has not expired yet"""
+        if self._prompt_cache_name and time.monotonic() < self._prompt_cache_expires_at:
+            return self._prompt_cache_name
+        return None
+    
+    def _invalidate_prompt_cache(self):
+        """Forget the current cache so the next request creates a new one"""
+        self._prompt_cache_name = None
+        self._prompt_cache_refresh_at = 0.0
+        self._prompt_cache_expires_at = 0.0
+    
+    @staticmethod
+    def _is_prompt_cache_error(e: Exception) -> bool:
+        """True if a Gemini error means the referenced cached content is missing or expired"""
+        if not isinstance(e, errors.APIError):
+            return False
+        message = str(e).lower()
+        return e.code in (403, 404) and "cache" in message
+    
+    async def generate_response(self, user_query: str, context: str,
+                                use_prompt_cache: bool = True) -> Tuple[AIResponse, Dict[str, Any], Dict[str, Any]]:
+        """Generate structured response using Gemini with full logging"""
+        
+        if not self.aclient:
+            raise HTTPException(status_code=503, detail="Gemini service not initialized")
+
+        cached_content = await self._get_prompt_cache() if use_prompt_cache else None
+        if cached_content:
+            # Instructions come from the cache; only context and question are sent
+            system_instruction = None
+            contents = [_CACHED_QUERY_TMPL.format_map({"context": context, "user_query": user_query})]
+        else:
+            system_instruction = self._prepare_system_prompt(context, user_query)
+            contents = [user_query]
+
+        # Prepare input for logging
+        gemini_input = {
+            "model": AppSettings.GEMINI_MODEL,
+            "system_instruction": system_instruction,
+            "cached_content": cached_content,
+            "user_query": user_query,
+            "config": _GENERATION_SETTINGS
+        }
+
+        try:
+            # Make the structured API call
+            response = await self.aclient.models.generate_content(
+                model=AppSettings.GEMINI_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instruction,
+                    cached_content=cached_content,
+                    response_schema=AIResponse,  # Enforce our schema
+                    **_GENERATION_SETTINGS
+                )
+            )
+
+            # Get both raw and parsed responses
+            raw_response = response.text
+            ai_response: AIResponse = response.parsed
+
+            # Prepare output for logging (request logs are written at INFO)
+            gemini_output = {
+                "raw_response": raw_response,
+                "parsed_response": ai_response.model_dump() if self.logger.is_enabled(logging.INFO) else None,
+                "duration": response.metadata.generation_time if hasattr(response, 'metadata') else None
+            }
+
+            self.logger.info("Gemini response generated successfully", {
+                "duration": gemini_output["duration"],
+                "answer_length": len(ai_response.answer),
+                "suggestions_count": len(ai_response.suggestions),
+                "confidence_score": ai_response.confidence_score
+            })
+
+            return ai_response, gemini_input, gemini_output
+
+        except Exception as e:
+            if cached_content and self._is_prompt_cache_error(e):
+                # The cache expired or was deleted: answer this request with the full prompt
+                # and let the next one create a fresh cache
+                self.logger.error("Gemini prompt cache missing, retrying with the full prompt", e)
+                self._invalidate_prompt_cache()
+                return await self.generate_response(user_query, context, use_prompt_cache=False)
+            
+            self.logger.error("Gemini call failed", e)
+            
+            # Prepare error response
+            error_response = AIResponse(
+                answer=f"Error processing your request: {str(e)}",
+                suggestions=["Please try again later", "Contact support if issue persists"],
+                was_context_valid=False,
+                confidence_score=0.0
+            )
+            
+            return error_response, gemini_input, {
+                "error": str(e),
+                "raw_response": getattr(response, 'text', '') if 'response' in locals() else None
+            }
+    
+    def _prepare_system_prompt(self, context: str, user_query: str) -> str:
+        """Prepare enhanced system prompt with complete metadata structure"""
+        return _SYSTEM_PROMPT_TMPL.format_map({"context": context, "user_query": user_query})
+
+    
+    
+    def _prepare_system_prompt_chat(self, context: str, user_query: str) -> str:
+        """Prepare enhanced system prompt with complete metadata structure"""
+        return _CHAT_PROMPT_TMPL.format_map({"context": context, "user_query": user_query})
+
+    async def generate_chat_response(self, message_history: List[ChatMessage], current_question: str,
                            context: str) -> Tuple[AIResponse, Dict[str, Any], Dict[str, Any]]:
         """Generate structured response using Gemini with chat history support"""
 
-        if not self.client:
+        if not self.aclient:
             raise HTTPException(status_code=503, detail="Gemini service not initialized")
 
-        import time
-        import json
-
         start_time = time.time()
 
         # Prepare system prompt
@@ -275,27 +396,17 @@ Respond with ONLY the JSON object:
             "contents": gemini_contents,
             "message_history_length": len(message_history),
             "current_question": current_question,
-            "config": {
-                "temperature": AppSettings.GEMINI_TEMPERATURE,
-                "max_output_tokens": AppSettings.GEMINI_MAX_OUTPUT_TOKENS,
-                "top_p": AppSettings.GEMINI_TOP_P,
-                "top_k": AppSettings.GEMINI_TOP_K,
-                "response_mime_type": "application/json"
-            }
+            "config": _GENERATION_SETTINGS
         }
 
         try:
             # Call Gemini API
-            response = self.client.models.generate_content(
+            response = await self.aclient.models.generate_content(
                 model=AppSettings.GEMINI_MODEL,
                 contents=gemini_contents,
                 config=types.GenerateContentConfig(
                     system_instruction=system_prompt,
-                    temperature=AppSettings.GEMINI_TEMPERATURE,
-                    max_output_tokens=AppSettings.GEMINI_MAX_OUTPUT_TOKENS,
-                    top_p=AppSettings.GEMINI_TOP_P,
-                    top_k=AppSettings.GEMINI_TOP_K,
-                    response_mime_type="application/json"
+                    **_GENERATION_SETTINGS
                 )
             )
 
@@ -0,0 +1,188 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from logging_utils import StructuredLogger
+
+
+class ContextCache:
+    """LRU cache of extracted contexts with exact-match and embedding-similarity lookup"""
+
+    def __init__(self, max_size: int = 512, ttl: float = 600.0, similarity_threshold: float = 0.97,
+                 copy_value: Optional[Callable[[Any], Any]] = None):
+        """
+        Args:
+            max_size: Entries kept before the least recently used is dropped
+            ttl: Seconds an entry stays valid
+            similarity_threshold: Minimum cosine similarity for get_similar hits
+            copy_value: Copies values on put and get so callers never share (and mutate)
+                the cached object; None stores and hands out values as they are
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.copy_value = copy_value
+        self._entries: "OrderedDict[Hashable, Tuple[float, np.ndarray, Any]]" = OrderedDict()
+        self._version = None
+        self._lock = threading.RLock()
+
+        # Stacked embeddings of all entries, rebuilt lazily after puts/evictions
+        self._keys: List[Hashable] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def check_version(self, version: Any):
+        """Drop every entry when the underlying index changed (e.g. new documents ingested)"""
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self.clear()
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for an exact key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return self._copy(entry[2])
+
+    def get_similar(self, embedding: Sequence[float], match: Tuple[Any, ...]) -> Optional[Any]:
+        """
+        Return the value cached for the most similar query embedding
+
+        Args:
+            embedding: Query embedding
+            match: Trailing key fields (e.g. top_k, response_mode) that must be equal
+
+        Returns:
+            Cached value if cosine similarity reaches the threshold, None otherwise
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            # Drop expired entries first so an expired best match cannot hide a valid one
+            now = time.monotonic()
+            for key in [key for key, entry in self._entries.items() if entry[0] < now]:
+                self._evict(key)
+            if not self._entries:
+                return None
+
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key][1] for key in self._keys])
+
+            # Stored embeddings are unit-length, so one GEMV gives all cosine similarities
+            similarities = self._matrix @ query
+            for i in np.argsort(similarities)[::-1]:
+                if similarities[i] < self.similarity_threshold:
+                    return None
+                key = self._keys[i]
+                if key[1:] == match:
+                    self._entries.move_to_end(key)
+                    return self._copy(self._entries[key][2])
+            return None
+
+    def put(self, key: Hashable, embedding: Sequence[float], value: Any):
+        """Cache a value under its exact key and query embedding"""
+        entry = (time.monotonic() + self.ttl, self._normalize(embedding), self._copy(value))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def _copy(self, value: Any) -> Any:
+        return self.copy_value(value) if self.copy_value is not None else value
+
+    def _evict(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class EmbeddingCache:
+    """Query embeddings persisted in SQLite so repeat queries skip the encoder across restarts"""
+
+    def __init__(self, db_path: str, namespace: str, logger: StructuredLogger):
+        """
+        Args:
+            db_path: SQLite file location
+            namespace: Identifies the embedding model; part of every key so a model change misses
+            logger: Service logger for cache failures
+        """
+        self.db_path = db_path
+        self.namespace = namespace.encode("utf-8") + b"\0"
+        self.logger = logger
+        self._local = threading.local()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite store, once per thread since connections cannot be shared between threads"""
+        if not hasattr(self._local, "conn"):
+            self._local.conn = None
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                # WAL lets request threads read while another one writes
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS emb (key BLOB PRIMARY KEY, v BLOB)")
+                self._local.conn = conn
+            except Exception as e:
+                self.logger.error("Embedding cache unavailable", e)
+        return self._local.conn
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(self.namespace + text.encode("utf-8")).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return the stored embedding for each text, or None on a miss"""
+        conn = self._connection()
+        if conn is None:
+            return [None] * len(texts)
+
+        keys = [self._key(text) for text in texts]
+        try:
+            rows = conn.execute(
+                f"SELECT key, v FROM emb WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.error("Embedding cache lookup failed", e)
+            return [None] * len(texts)
+
+        found = {key: np.frombuffer(v, dtype=np.float32).tolist() for key, v in rows}
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store embeddings for several texts"""
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO emb (key, v) VALUES (?, ?)",
+                    [(self._key(text), np.asarray(embedding, dtype=np.float32).tobytes())
+                     for text, embedding in zip(texts, embeddings)]
+                )
+        except sqlite3.Error as e:
+            self.logger.error("Embedding cache write failed", e)
@@ -1,9 +1,103 @@
+import atexit
 import logging
-import json
+import queue
 import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
 from typing import Dict, Any, Optional
+import orjson
+from pydantic import BaseModel
 from schemas import RequestLog
 
+
+def _default(obj: Any) -> Any:
+    # Pydantic models (e.g. the final response) are dumped here, on the listener thread
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return str(obj)
+
+
+def _dumps(log_entry: Dict[str, Any]) -> str:
+    """Serialize a log entry to a JSON string (non-ASCII kept as-is, unknown types via str)"""
+    return orjson.dumps(log_entry, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves dict messages for the listener thread to serialize"""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.msg, dict):
+            return record
+        return super().prepare(record)
+    
+    def enqueue(self, record: logging.LogRecord):
+        # Under sustained overload drop records instead of blocking requests or growing without bound
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BatchingQueueListener(QueueListener):
+    """Queue listener that serializes dict messages and flushes file output in batches"""
+    
+    def __init__(self, log_queue: queue.Queue, *handlers, flush_records: int = 100, flush_interval: float = 0.05, **kwargs):
+        super().__init__(log_queue, *handlers, **kwargs)
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+    
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        # Flush buffered output whenever the queue goes idle
+        if self._unflushed:
+            try:
+                return self.queue.get(block, self.flush_interval)
+            except queue.Empty:
+                self._flush()
+        return self.queue.get(block)
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.msg, dict):
+            record.msg = _dumps(record.msg)
+        return record
+    
+    def handle(self, record: logging.LogRecord):
+        super().handle(record)
+        self._unflushed += 1
+        if self._unflushed >= self.flush_records or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+    
+    def enqueue_sentinel(self):
+        # The queue is bounded; wait for room rather than failing at shutdown
+        self.queue.put(self._sentinel)
+    
+    def stop(self):
+        super().stop()
+        self._flush()
+    
+    def _flush(self):
+        for handler in self.handlers:
+            handler.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+
+class _BufferedFileHandler(logging.FileHandler):
+    """File handler whose writes are only flushed when the listener asks for it"""
+    
+    def emit(self, record: logging.LogRecord):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
 class StructuredLogger:
     """Structured logger for production use"""
     
@@ -16,7 +110,7 @@ class StructuredLogger:
             self.logger.removeHandler(handler)
         
         # File handler for JSON logs
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler = _BufferedFileHandler(log_file, encoding='utf-8')
         file_formatter = logging.Formatter('%(message)s')
         file_handler.setFormatter(file_formatter)
         
@@ -25,8 +119,23 @@ class StructuredLogger:
         console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         console_handler.setFormatter(console_formatter)
         
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Request threads only enqueue records; a listener thread serializes them and
+        # writes the file in batches (every 100 records or 50 ms)
+        self._queue = queue.Queue(maxsize=10_000)
+        self._queue_handler = _DeferredQueueHandler(self._queue)
+        self.logger.addHandler(self._queue_handler)
+        self._listener = _BatchingQueueListener(self._queue, file_handler, console_handler, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+    
+    def is_enabled(self, level: int) -> bool:
+        """Return True if messages at this level would be written"""
+        return self.logger.isEnabledFor(level)
+    
+    @property
+    def dropped_records(self) -> int:
+        """Records discarded because the log queue was full"""
+        return self._queue_handler.dropped
     
     def log_request(self, request_log: RequestLog):
         """Log complete request with structured JSON"""
@@ -48,13 +157,22 @@ class StructuredLogger:
             "error": request_log.error
         }
         
-        self.logger.info(json.dumps(log_entry, ensure_ascii=False))
+        # Serialized on the listener thread, off the request path
+        self.logger.info(log_entry)
+    
+    def debug(self, message: str, extra_data: Optional[Dict[str, Any]] = None):
+        """Log debug message with optional structured data"""
+        if extra_data:
+            log_entry = {"message": message, "data": extra_data}
+            self.logger.debug(log_entry)
+        else:
+            self.logger.debug(message)
     
     def info(self, message: str, extra_data: Optional[Dict[str, Any]] = None):
         """Log info message with optional structured data"""
         if extra_data:
             log_entry = {"message": message, "data": extra_data}
-            self.logger.info(json.dumps(log_entry, ensure_ascii=False))
+            self.logger.info(log_entry)
         else:
             self.logger.info(message)
     
@@ -66,4 +184,4 @@ class StructuredLogger:
             "error_type": type(error).__name__ if error else None,
             "data": extra_data
         }
-        self.logger.error(json.dumps(log_entry, ensure_ascii=False))
\ No newline at end of file
+        self.logger.error(log_entry)
\ No newline at end of file
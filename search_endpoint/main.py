@@ -1,13 +1,15 @@
+import asyncio
 import time
 import uuid
 from datetime import datetime
 import socket
-from contextlib import closing
+from contextlib import asynccontextmanager, closing
+from anyio import to_thread
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from settings import Settings as AppSettings
-from schemas import SearchRequest, SearchResponse, RequestLog , ChatSearchRequest, ChatSearchResponse, ChatMessage
+from schemas import SearchRequest, SearchResponse, RequestLog , ChatSearchRequest, ChatSearchResponse, ChatMessage, BatchSearchRequest, BatchSearchResponse
 from vector_service import VectorService
 from ai_service import AIService
 from logging_utils import StructuredLogger
@@ -19,8 +21,18 @@ from query_utils import QueryProcessor
 logger = StructuredLogger(AppSettings.LOG_FILE, AppSettings.LOG_LEVEL)
 vector_service = VectorService(logger)
 ai_service = AIService(logger)
+_background_tasks = set()
 
-app = FastAPI(title="Production Document Search API with ChromaDB")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Retrieval runs in worker threads, which share this limiter with Starlette's sync endpoints
+    to_thread.current_default_thread_limiter().total_tokens = AppSettings.WORKER_THREADS
+    vector_service.rerank_batcher.start()
+    yield
+    vector_service.rerank_batcher.stop()
+
+app = FastAPI(title="Production Document Search API with ChromaDB", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -29,136 +41,202 @@ app.add_middleware(
 )
 
 def check_port(port: int) -> bool:
-    """Check if a port is available"""
+    """Check if a port is available by trying to bind it"""
     with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
-        return sock.connect_ex(('localhost', port)) != 0
+        # Same options uvicorn binds with, so TIME_WAIT leftovers don't count as in use
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("0.0.0.0", port))
+        except OSError:
+            return False
+        return True
 
 @app.post("/ai/api/search", response_model=SearchResponse)
 async def search(request: SearchRequest):
     
     """Enhanced document search with structured logging"""
-    request_id = str(uuid.uuid4())
-    start_time = time.time()
+    request_id = uuid.uuid4().hex
+    start_time = time.perf_counter()
     timestamp = datetime.now()
     
+    # Clean query (also reused by the error log)
+    cleaned_query = QueryProcessor.clean_query(request.question)
+    
     try:
-        # Clean query
-        cleaned_query = QueryProcessor.clean_query(request.question)
-        
         if request.is_follow_up and request.previous_context:
-            context = request.previous_context
-            source_nodes = []
-            synthesis_method = "follow_up"
-            chunks = []
+            retrieval = (request.previous_context, [], "follow_up", [])
         else:
             # Normal retrieval
-            context, source_nodes, synthesis_method, chunks = vector_service.extract_context(
-                cleaned_query, request.top_k, request.response_mode
+            retrieval = await to_thread.run_sync(
+                vector_service.extract_context, cleaned_query, request.top_k, request.response_mode
             )
         
         # Generate AI response
-        ai_response, gemini_input, gemini_output = ai_service.generate_response(
-            request.question, context
-        )
-        
+        ai_result = await ai_service.generate_response(request.question, retrieval[0])
         
-        processing_time = time.time() - start_time
-        
-        # Prepare final response
-        final_response = SearchResponse(
-            answer=ai_response.answer,
-            context=context,
-            suggestions=ai_response.suggestions,
-            was_context_valid=ai_response.was_context_valid,
-            confidence_score=ai_response.confidence_score,
-            success=True,
-            ai_used="gemini",
-            processing_time=processing_time,
-            source_nodes=source_nodes,
-            synthesis_method=synthesis_method,
-            total_sources=len(source_nodes)
-        )
-        
-        # Log complete request
-        request_log = RequestLog(
-            request_id=request_id,
-            timestamp=timestamp,
-            query=request.question,
-            cleaned_query=cleaned_query,
-            top_k=request.top_k,
-            response_mode=request.response_mode,
-            context=context,
-            chunks=chunks,
-            gemini_input=gemini_input,
-            gemini_output=gemini_output,
-            final_response=final_response.dict(),
-            processing_time=processing_time,
-            success=True
-        )
-        
-        logger.log_request(request_log)
-        
-        return final_response
+        return _search_response(request, request_id, timestamp, start_time, cleaned_query, retrieval, ai_result)
         
     except Exception as e:
-        processing_time = time.time() - start_time
-        
-        error_response = SearchResponse(
-            answer=f"Search failed: {str(e)}",
-            context="",
-            suggestions=["Try rephrasing your question", "Check system status"],
-            was_context_valid=False,
-            confidence_score=0.0,
-            success=False,
-            ai_used="none",
-            processing_time=processing_time,
-            source_nodes=[],
-            synthesis_method="none",
-            total_sources=0
-        )
-        
-        # Log failed request
-        request_log = RequestLog(
-            request_id=request_id,
-            timestamp=timestamp,
-            query=request.question,
-            cleaned_query=QueryProcessor.clean_query(request.question),
-            top_k=request.top_k,
-            response_mode=request.response_mode,
-            context="",
-            chunks=[],
-            gemini_input={},
-            gemini_output={},
-            final_response=error_response.dict(),
-            processing_time=processing_time,
-            success=False,
-            error=str(e)
-        )
-        
-        logger.log_request(request_log)
-        
-        return error_response
+        return _search_error_response(request, request_id, timestamp, start_time, cleaned_query, e)
+
+
+@app.post("/ai/api/search-batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchSearchRequest):
+    """Answer several search requests with shared embedding, retrieval and reranking"""
+    start_time = time.perf_counter()
+    timestamp = datetime.now()
+    items = request.requests
+    request_ids = [uuid.uuid4().hex for _ in items]
+    cleaned_queries = [QueryProcessor.clean_query(item.question) for item in items]
+    
+    # Follow-ups reuse their previous context; everything else is retrieved in one call
+    retrieval_indices = [
+        i for i, item in enumerate(items)
+        if not (item.is_follow_up and item.previous_context)
+    ]
+    retrievals = {}
+    retrieval_error = None
+    if retrieval_indices:
+        try:
+            contexts = await to_thread.run_sync(
+                vector_service.extract_context_batch,
+                [(cleaned_queries[i], items[i].top_k, items[i].response_mode) for i in retrieval_indices]
+            )
+            retrievals = dict(zip(retrieval_indices, contexts))
+        except Exception as e:
+            retrieval_error = e
+    
+    async def answer(i: int):
+        item = items[i]
+        if i in retrievals:
+            retrieval = retrievals[i]
+        elif item.is_follow_up and item.previous_context:
+            retrieval = (item.previous_context, [], "follow_up", [])
+        else:
+            raise retrieval_error
+        ai_result = await ai_service.generate_response(item.question, retrieval[0])
+        return retrieval, ai_result
+    
+    # Gemini calls for the whole batch are in flight together
+    outcomes = await asyncio.gather(*(answer(i) for i in range(len(items))), return_exceptions=True)
+    
+    responses = []
+    for i, (item, outcome) in enumerate(zip(items, outcomes)):
+        if isinstance(outcome, Exception):
+            responses.append(_search_error_response(item, request_ids[i], timestamp, start_time, cleaned_queries[i], outcome))
+        else:
+            retrieval, ai_result = outcome
+            responses.append(_search_response(
+                item, request_ids[i], timestamp, start_time, cleaned_queries[i], retrieval, ai_result
+            ))
+    
+    return BatchSearchResponse.model_construct(responses=responses, processing_time=time.perf_counter() - start_time)
+
+
+def _search_response(request: SearchRequest, request_id: str, timestamp: datetime, start_time: float,
+                     cleaned_query: str, retrieval: tuple, ai_result: tuple) -> SearchResponse:
+    """Build and log the response for an answered search request"""
+    context, source_nodes, synthesis_method, chunks = retrieval
+    ai_response, gemini_input, gemini_output = ai_result
+    processing_time = time.perf_counter() - start_time
+    
+    # Prepare final response (built from our own typed values, so validation is skipped)
+    final_response = SearchResponse.model_construct(
+        answer=ai_response.answer,
+        context=context,
+        suggestions=ai_response.suggestions,
+        was_context_valid=ai_response.was_context_valid,
+        confidence_score=ai_response.confidence_score,
+        success=True,
+        ai_used="gemini",
+        processing_time=processing_time,
+        source_nodes=source_nodes,
+        synthesis_method=synthesis_method,
+        total_sources=len(source_nodes)
+    )
+    
+    # Log complete request
+    request_log = RequestLog(
+        request_id=request_id,
+        timestamp=timestamp,
+        query=request.question,
+        cleaned_query=cleaned_query,
+        top_k=request.top_k,
+        response_mode=request.response_mode,
+        chunks=chunks,
+        gemini_input=gemini_input,
+        gemini_output=gemini_output,
+        final_response=final_response,
+        processing_time=processing_time,
+        success=True
+    )
+    
+    logger.log_request(request_log)
+    
+    return final_response
+
+
+def _search_error_response(request: SearchRequest, request_id: str, timestamp: datetime, start_time: float,
+                           cleaned_query: str, e: Exception) -> SearchResponse:
+    """Build and log the response for a failed search request"""
+    processing_time = time.perf_counter() - start_time
+    
+    error_response = SearchResponse(
+        answer=f"Search failed: {str(e)}",
+        context="",
+        suggestions=["Try rephrasing your question", "Check system status"],
+        was_context_valid=False,
+        confidence_score=0.0,
+        success=False,
+        ai_used="none",
+        processing_time=processing_time,
+        source_nodes=[],
+        synthesis_method="none",
+        total_sources=0
+    )
+    
+    # Log failed request
+    request_log = RequestLog(
+        request_id=request_id,
+        timestamp=timestamp,
+        query=request.question,
+        cleaned_query=cleaned_query,
+        top_k=request.top_k,
+        response_mode=request.response_mode,
+        chunks=[],
+        gemini_input={},
+        gemini_output={},
+        final_response=error_response,
+        processing_time=processing_time,
+        success=False,
+        error=str(e)
+    )
+    
+    logger.log_request(request_log)
+    
+    return error_response
 
 
 @app.post("/ai/api/search-chat", response_model=ChatSearchResponse)
 async def search_chat(request: ChatSearchRequest):
     """Enhanced stateless chat search with context management"""
-    request_id = str(uuid.uuid4())
-    start_time = time.time()
+    request_id = uuid.uuid4().hex
+    start_time = time.perf_counter()
     timestamp = datetime.now()
     #context_refreshed = False
     
+    # Clean query (also reused by the error log)
+    cleaned_query = QueryProcessor.clean_query(request.question)
+    
     try:
-        # Clean query
-        cleaned_query = QueryProcessor.clean_query(request.question)
-        
         # Determine if we need new context
         needs_new_context = _should_fetch_new_context(request)
+        speculative_context = None
         
         if needs_new_context:
             # Fetch new context
-            context, source_nodes, synthesis_method, chunks = vector_service.extract_context(
-                cleaned_query, request.top_k, request.response_mode
+            context, source_nodes, synthesis_method, chunks = await to_thread.run_sync(
+                vector_service.extract_context, cleaned_query, request.top_k, request.response_mode
             )
             #context_refreshed = True
         else:
@@ -167,9 +245,16 @@ async def search_chat(request: ChatSearchRequest):
             source_nodes = []
             synthesis_method = "reuse_context"
             chunks = []
+            
+            if AppSettings.SPECULATIVE_RETRIEVAL and _context_likely_stale(request, cleaned_query):
+                # Retrieve fresh context while Gemini judges the reused one, so it is ready
+                # if that context turns out invalid
+                speculative_context = _start_background(to_thread.run_sync(
+                    vector_service.extract_context, cleaned_query, request.top_k, request.response_mode
+                ))
         
         # Generate AI response with full message history
-        ai_response, gemini_input, gemini_output = ai_service.generate_chat_response(
+        ai_response, gemini_input, gemini_output = await ai_service.generate_chat_response(
             message_history=request.message_history,
             current_question=request.question,
             context=context
@@ -182,23 +267,26 @@ async def search_chat(request: ChatSearchRequest):
         # If context was invalid and we haven't refreshed yet, fetch new context
         if not ai_response.was_context_valid:
             logger.info("Context invalid, fetching new context", {"query": cleaned_query})
-            context, source_nodes, synthesis_method, chunks = vector_service.extract_context(
-                cleaned_query, request.top_k, request.response_mode
-            )
+            if speculative_context is not None:
+                context, source_nodes, synthesis_method, chunks = await speculative_context
+            else:
+                context, source_nodes, synthesis_method, chunks = await to_thread.run_sync(
+                    vector_service.extract_context, cleaned_query, request.top_k, request.response_mode
+                )
             #context_refreshed = True
 
             # Retry with new context
-            ai_response, gemini_input, gemini_output = ai_service.generate_chat_response(
+            ai_response, gemini_input, gemini_output = await ai_service.generate_chat_response(
                 message_history=request.message_history,
                 current_question=request.question,
                 context=context
             )
             was_context_valid_new_key = ai_response.was_context_valid
 
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
         
-        # Prepare final response
-        final_response = ChatSearchResponse(
+        # Prepare final response (built from our own typed values, so validation is skipped)
+        final_response = ChatSearchResponse.model_construct(
             answer=ai_response.answer,
             context=context,
             suggestions=ai_response.suggestions,
@@ -227,7 +315,7 @@ async def search_chat(request: ChatSearchRequest):
             chunks=chunks,
             gemini_input=gemini_input,
             gemini_output=gemini_output,
-            final_response=final_response.dict(),
+            final_response=final_response,
             processing_time=processing_time,
             success=True,
         )
@@ -236,7 +324,7 @@ async def search_chat(request: ChatSearchRequest):
         return final_response
         
     except Exception as e:
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
         
         error_response = ChatSearchResponse(
             answer=f"I apologize, but I encountered an error: {str(e)}",
@@ -261,13 +349,13 @@ async def search_chat(request: ChatSearchRequest):
             request_id=request_id,
             timestamp=timestamp,
             query=request.question,
-            cleaned_query=QueryProcessor.clean_query(request.question),
+            cleaned_query=cleaned_query,
             top_k=request.top_k,
             response_mode=request.response_mode,
             chunks=[],
             gemini_input={},
             gemini_output={},
-            final_response=error_response.dict(),
+            final_response=error_response,
             processing_time=processing_time,
             success=False,
             error=str(e)
@@ -277,6 +365,36 @@ async def search_chat(request: ChatSearchRequest):
         return error_response
 
 
+def _start_background(coro) -> asyncio.Task:
+    """Run a coroutine as a task that may finish after the request that started it"""
+    task = asyncio.create_task(coro)
+    # Hold a reference until done, and consume the exception of tasks nobody awaits
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return task
+
+
+def _context_likely_stale(request: ChatSearchRequest, cleaned_query: str) -> bool:
+    """Cheap guess whether the reused context will be judged invalid (worth speculating on)"""
+    if len(request.message_history) >= AppSettings.SPECULATIVE_MIN_HISTORY:
+        return True
+    
+    previous_question = next(
+        (message.content for message in reversed(request.message_history) if message.role == "user"), None
+    )
+    if previous_question is None:
+        return True
+    
+    # Word overlap with the previous question; a topic change shares few words
+    current_words = set(cleaned_query.split())
+    previous_words = set(QueryProcessor.clean_query(previous_question).split())
+    if not current_words or not previous_words:
+        return True
+    overlap = len(current_words & previous_words) / len(current_words | previous_words)
+    return overlap < AppSettings.SPECULATIVE_MAX_QUERY_OVERLAP
+
+
 def _should_fetch_new_context(request: ChatSearchRequest) -> bool:
     """Determine if we need to fetch new context based on conversation state"""
     
@@ -301,7 +419,7 @@ async def health_check():
     return {
         "status": "healthy",
         "services": {
-            "chromadb": vector_service.index is not None,
+            "chromadb": vector_service.chroma_collection is not None,
             "gemini": ai_service.client is not None
         },
         "timestamp": time.time()
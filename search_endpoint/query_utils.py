@@ -1,42 +1,30 @@
 import re
-from typing import Set
+from typing import FrozenSet
+
+_RE_NL = re.compile(r'[\r\n]+')
+_RE_WS = re.compile(r'\s+')
+_RE_CLEAN = re.compile(r'[^\w\s\-\.\?\!]')
 
 
 def normalize_text(text: str) -> str:
         """Normalize line breaks and whitespace globally"""
-        # Replace all line breaks (including \r\n) with single space
-        text = re.sub(r'[\r\n]+', ' ', text)
-        # Collapse multiple spaces
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
+        # Replace all line breaks (including \r\n) with single space, then collapse multiple spaces
+        return _RE_WS.sub(' ', _RE_NL.sub(' ', text)).strip()
     
 class QueryProcessor:
     """Query processing utilities"""
     
-    STOP_WORDS: Set[str] = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
+    STOP_WORDS: FrozenSet[str] = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
     
     @classmethod
-    
-
     def clean_query(cls, raw_query: str) -> str:
         """Clean and normalize user query"""
-        try:
-            cleaned = cls.normalize_text(raw_query)
-            # Remove extra whitespace
-            # cleaned = re.sub(r'\s+', ' ', raw_query.strip())
-            
-            # Remove special characters that might interfere with search
-            cleaned = re.sub(r'[^\w\s\-\.\?\!]', '', cleaned)
-            
-            # Convert to lowercase for consistency
-            cleaned = cleaned.lower()
-            
-            # Remove common stop words that don't add semantic value for search
-            words = cleaned.split()
-            cleaned_words = [word for word in words if word not in cls.STOP_WORDS or len(words) <= 3]
-            cleaned = ' '.join(cleaned_words)
-            
-            return cleaned
-            
-        except Exception:
-            return raw_query  # Return original if cleaning fails
\ No newline at end of file
+        # Remove special characters that might interfere with search and convert to lowercase;
+        # split() below also collapses line breaks and whitespace, so this is the only regex pass
+        words = _RE_CLEAN.sub('', raw_query).lower().split()
+        
+        # Remove common stop words that don't add semantic value for search
+        if len(words) > 3:
+            stop = cls.STOP_WORDS
+            words = [word for word in words if word not in stop]
+        return ' '.join(words)
@@ -0,0 +1,169 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class RerankBatcher:
+    """Coalesces cross-encoder calls from concurrent requests into shared forward passes"""
+
+    def __init__(self, reranker, max_batch_size: int = 64, max_delay: float = 0.02,
+                 timeout: Optional[float] = 10.0):
+        """
+        Args:
+            reranker: Model exposing predict(pairs, batch_size=...) (e.g. sentence-transformers CrossEncoder)
+            max_batch_size: Pair count at which a batch is flushed without waiting
+            max_delay: Seconds the first queued task waits for others to join its batch
+            timeout: Seconds a caller waits for its scores before giving up (None waits forever)
+        """
+        self.reranker = reranker
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._queue: "queue.Queue[Optional[Tuple[List[Tuple[str, str]], Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Guards _accepting so no task is enqueued behind the stop sentinel
+        self._lock = threading.Lock()
+        self._accepting = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background batching thread"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._thread.start()
+        with self._lock:
+            self._accepting = True
+
+    def stop(self):
+        """Flush pending tasks and stop the batching thread"""
+        with self._lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+            self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        # Fail anything the thread did not get to (e.g. it died), so no caller waits on it
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None and task[1].set_running_or_notify_cancel():
+                task[1].set_exception(RuntimeError("Rerank batcher stopped"))
+
+    def predict(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        """
+        Score texts against a query, batched with any concurrent callers
+
+        Args:
+            query: Search query
+            texts: Candidate passages
+
+        Returns:
+            Relevance scores in the order of texts
+        """
+        return self.predict_many([(query, texts)])[0]
+
+    def predict_many(self, items: Sequence[Tuple[str, Sequence[str]]]) -> List[np.ndarray]:
+        """
+        Score several (query, texts) items, submitted together so they share batches
+
+        Args:
+            items: (query, candidate passages) per query
+
+        Returns:
+            Relevance scores per item
+        """
+        tasks = [[(query, text) for text in texts] for query, texts in items]
+        futures = []
+        with self._lock:
+            if self._accepting and self.running:
+                for pairs in tasks:
+                    future: Future = Future()
+                    if pairs:
+                        self._queue.put((pairs, future))
+                    else:
+                        future.set_result(np.empty(0))
+                    futures.append(future)
+
+        if not futures:
+            # Not started, stopping or dead (e.g. outside the app lifespan): score inline
+            all_pairs = [pair for pairs in tasks for pair in pairs]
+            if not all_pairs:
+                return [np.empty(0) for _ in tasks]
+            scores = np.asarray(self.reranker.predict(all_pairs, batch_size=self.max_batch_size))
+            return self._split(scores, tasks)
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            return [
+                future.result(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+                for future in futures
+            ]
+        except FutureTimeoutError:
+            # Drop our queued tasks so the thread does not score them for nobody
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            task = self._queue.get()
+            if task is None:
+                break
+
+            tasks = [task]
+            pair_count = len(task[0])
+            deadline = time.monotonic() + self.max_delay
+            while pair_count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    task = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if task is None:
+                    stopping = True
+                    break
+                tasks.append(task)
+                pair_count += len(task[0])
+
+            self._score(tasks)
+
+    def _score(self, tasks: List[Tuple[List[Tuple[str, str]], Future]]):
+        # Skip tasks whose caller timed out and cancelled them
+        tasks = [task for task in tasks if task[1].set_running_or_notify_cancel()]
+        if not tasks:
+            return
+        all_pairs = [pair for pairs, _ in tasks for pair in pairs]
+        try:
+            scores = np.asarray(self.reranker.predict(all_pairs, batch_size=self.max_batch_size))
+        except Exception as e:
+            for _, future in tasks:
+                future.set_exception(e)
+            return
+
+        for (_, future), task_scores in zip(tasks, self._split(scores, [pairs for pairs, _ in tasks])):
+            future.set_result(task_scores)
+
+    @staticmethod
+    def _split(scores: np.ndarray, tasks: List[List[Tuple[str, str]]]) -> List[np.ndarray]:
+        result = []
+        offset = 0
+        for pairs in tasks:
+            result.append(scores[offset:offset + len(pairs)])
+            offset += len(pairs)
+        return result
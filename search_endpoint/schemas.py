@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
@@ -53,8 +54,19 @@ class SearchResponse(BaseModel):
     synthesis_method: str = Field(description="Method used for response synthesis")
     total_sources: int = Field(description="Total number of sources used")
 
-class RequestLog(BaseModel):
-    """Request logging model"""
+class BatchSearchRequest(BaseModel):
+    """Several independent search requests answered in one round-trip"""
+    requests: List[SearchRequest] = Field(min_length=1, max_length=32)
+
+
+class BatchSearchResponse(BaseModel):
+    """Responses in request order"""
+    responses: List[SearchResponse]
+    processing_time: float
+
+@dataclass(slots=True)
+class RequestLog:
+    """Request log record (trusted in-process data, so not validated)"""
     request_id: str
     timestamp: datetime
     query: str
@@ -65,7 +77,7 @@ class RequestLog(BaseModel):
     chunks: List[dict]
     gemini_input: dict
     gemini_output: dict
-    final_response: dict
+    final_response: BaseModel  # Response model, serialized by the log listener
     processing_time: float
     success: bool
     error: Optional[str] = None
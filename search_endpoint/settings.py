@@ -1,5 +1,4 @@
 import os
-from typing import Dict, Any
 
 class Settings:
     """Application configuration settings"""
@@ -12,29 +11,58 @@ class Settings:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "key")
     GEMINI_MODEL = "gemini-2.5-flash"
     
+    # Query embedding model; must match the model (and ONNX file) used by the index pipeline
+    EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+    USE_ONNX = True  # ONNX Runtime on CPU instead of PyTorch
+    ONNX_QUANTIZE = True
+    ONNX_MODEL_FILE = "onnx/model.onnx"
+    ONNX_QUANTIZED_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
+    
     INITIAL_RETRIEVAL_MULTIPLIER = 2
     
+    # Threads available to blocking retrieval work offloaded from the event loop
+    WORKER_THREADS = 64  # anyio default is 40
+    
     # Search configuration
     DEFAULT_TOP_K = 3
     DEFAULT_RESPONSE_MODE = "compact"
     MAX_CONTEXT_LENGTH = 3000
     
+    # In chat, retrieve fresh context alongside the Gemini call that judges a reused context,
+    # but only when that context looks stale: the question shares few words with the previous
+    # user message, or the conversation has run long
+    SPECULATIVE_RETRIEVAL = False
+    SPECULATIVE_MAX_QUERY_OVERLAP = 0.3
+    SPECULATIVE_MIN_HISTORY = 10  # messages
+    
+    # Extracted-context cache (exact query match, then embedding similarity)
+    CONTEXT_CACHE_SIZE = 512
+    CONTEXT_CACHE_TTL = 600  # seconds
+    CONTEXT_CACHE_SIMILARITY = 0.97
+    
+    # Query embeddings persisted across restarts (SQLite, keyed by model + cleaned query)
+    EMBEDDING_CACHE_ENABLED = True
+    EMBEDDING_CACHE_PATH = "../embedding_cache/query_embeddings.sqlite"
+    
+    # Cross-encoder calls from concurrent requests are coalesced into one forward pass
+    RERANK_MAX_BATCH_SIZE = 64  # query/passage pairs
+    RERANK_MAX_DELAY = 0.02  # seconds
+    RERANK_TIMEOUT = 10.0  # seconds a request waits for its scores
+    
     # Gemini configuration
     GEMINI_TEMPERATURE = 0.2
     GEMINI_MAX_OUTPUT_TOKENS = 1500
     GEMINI_TOP_P = 0.8
     GEMINI_TOP_K = 40
     
+    # Cache the static search instructions server-side (Gemini context caching). Off by
+    # default: the current instructions (~500 tokens) are below the model minimum, so this
+    # only pays off once they grow past GEMINI_PROMPT_CACHE_MIN_TOKENS
+    GEMINI_PROMPT_CACHE_ENABLED = False
+    GEMINI_PROMPT_CACHE_TTL = 3600  # seconds
+    GEMINI_PROMPT_CACHE_RETRY_INTERVAL = 60  # seconds after a failed create
+    GEMINI_PROMPT_CACHE_MIN_TOKENS = 1024  # Gemini 2.5 Flash rejects smaller cached contents
+    
     # Logging configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE = "../logs/document_search.log"
-    
-    @classmethod
-    def get_response_mode_map(cls) -> Dict[str, Any]:
-        from llama_index.core.response_synthesizers import ResponseMode
-        return {
-            "compact": ResponseMode.COMPACT,
-            "tree_summarize": ResponseMode.TREE_SUMMARIZE,
-            "accumulate": ResponseMode.ACCUMULATE,
-            "simple_summarize": ResponseMode.SIMPLE_SUMMARIZE
-        }
\ No newline at end of file
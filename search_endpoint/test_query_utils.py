@@ -0,0 +1,13 @@
+from query_utils import QueryProcessor
+
+
+def test_clean_query_removes_stop_words_from_longer_queries():
+    assert QueryProcessor.clean_query("What is the policy for remote work") == "what is policy remote work"
+
+
+def test_clean_query_keeps_stop_words_in_short_queries():
+    assert QueryProcessor.clean_query("The Office Policy") == "the office policy"
+
+
+def test_clean_query_strips_punctuation_and_whitespace():
+    assert QueryProcessor.clean_query("  leave (annual)\r\n policy: 2024?  ") == "leave annual policy 2024?"
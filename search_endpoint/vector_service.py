@@ -1,48 +1,95 @@
+import logging
+import math
 import time
 from typing import Tuple, List
 from fastapi import HTTPException
-from llama_index.core import VectorStoreIndex, Settings, get_response_synthesizer
-from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.core.retrievers import VectorIndexRetriever
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
+import numpy as np
 from sentence_transformers import CrossEncoder
 from query_utils import normalize_text
+from cache_utils import ContextCache, EmbeddingCache
+from rerank_utils import RerankBatcher
 
 from settings import Settings as AppSettings
 from schemas import SourceNode, SourceMetadata
 from logging_utils import StructuredLogger
 
-Settings.llm = None
+# Document metadata fields copied verbatim into SourceMetadata
+_META_KEYS = (
+    "DOC_DESCRIPTION",
+    "DOC_TITLE",
+    "DOC_DESCRIPTION_FORMATTED",
+    "TAGS",
+    "PRESENTATION_DATE",
+    "DOC_MODULE",
+    "PRESENTATION_LINK",
+    "PRESENTER_1_NAME",
+)
+
+# Labels and SourceMetadata fields of the metadata block shown to the model, after the score
+_CONTEXT_META_FIELDS = (
+    ("TITLE", "DOC_TITLE"),
+    ("DESCRIPTION", "DOC_DESCRIPTION"),
+    ("DESCRIPTION_FORMATTED", "DOC_DESCRIPTION_FORMATTED"),
+    ("MODULE", "DOC_MODULE"),
+    ("PRESENTATION_DATE", "PRESENTATION_DATE"),
+    ("TAGS", "TAGS"),
+)
+
 class VectorService:
     """Vector search and retrieval service"""
     
     def __init__(self, logger: StructuredLogger):
         self.logger = logger
-        self.index = None
         self.embed_model = None
+        self.chroma_collection = None
+        self.context_cache = ContextCache(
+            max_size=AppSettings.CONTEXT_CACHE_SIZE,
+            ttl=AppSettings.CONTEXT_CACHE_TTL,
+            similarity_threshold=AppSettings.CONTEXT_CACHE_SIMILARITY,
+            copy_value=self._copy_result
+        )
         self._initialize()
+        
+        self.embedding_cache = None
+        if AppSettings.EMBEDDING_CACHE_ENABLED:
+            model_file = ""
+            if AppSettings.USE_ONNX:
+                model_file = AppSettings.ONNX_QUANTIZED_MODEL_FILE if AppSettings.ONNX_QUANTIZE else AppSettings.ONNX_MODEL_FILE
+            self.embedding_cache = EmbeddingCache(
+                AppSettings.EMBEDDING_CACHE_PATH, f"{AppSettings.EMBED_MODEL_NAME}:{model_file}", logger
+            )
+        
         self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        self.rerank_batcher = RerankBatcher(
+            self.reranker,
+            max_batch_size=AppSettings.RERANK_MAX_BATCH_SIZE,
+            max_delay=AppSettings.RERANK_MAX_DELAY,
+            timeout=AppSettings.RERANK_TIMEOUT
+        )
     
     def _initialize(self):
-        """Initialize ChromaDB index and embedding model"""
+        """Initialize ChromaDB collection and embedding model"""
         try:
-            self.embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+            # Run the query encoder through ONNX Runtime (optionally INT8-quantized), as the indexer does on CPU
+            backend_kwargs = {}
+            if AppSettings.USE_ONNX:
+                backend_kwargs = {
+                    "device": "cpu",
+                    "backend": "onnx",
+                    "model_kwargs": {
+                        "file_name": AppSettings.ONNX_QUANTIZED_MODEL_FILE if AppSettings.ONNX_QUANTIZE else AppSettings.ONNX_MODEL_FILE
+                    }
+                }
+            self.embed_model = HuggingFaceEmbedding(model_name=AppSettings.EMBED_MODEL_NAME, **backend_kwargs)
             
             # Initialize ChromaDB client and collection
             chroma_client = chromadb.PersistentClient(path=AppSettings.PERSIST_DIR)
-            chroma_collection = chroma_client.get_collection(AppSettings.COLLECTION_NAME)
-            
-            # Create vector store and load index
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-            self.index = VectorStoreIndex.from_vector_store(
-                vector_store=vector_store,
-                embed_model=self.embed_model
-            )
+            self.chroma_collection = chroma_client.get_collection(AppSettings.COLLECTION_NAME)
             
             self.logger.info(f"ChromaDB index loaded successfully", {
-                "collection_count": chroma_collection.count()
+                "collection_count": self.chroma_collection.count()
             })
             
         except Exception as e:
@@ -50,150 +97,236 @@ class VectorService:
             raise RuntimeError("Could not initialize search system")
         
     def extract_context(self, query: str, top_k: int = 3, response_mode: str = "compact") -> Tuple[str, List[SourceNode], str, List[dict]]:
-        """Extract relevant context chunks using synthesizer"""
-        if not self.index:
+        """Extract relevant context chunks with inline metadata"""
+        if self.chroma_collection is None:
             raise HTTPException(status_code=500, detail="Search index not available")
         
         start_time = time.time()
         try:
-
-            initial_top_k = top_k * AppSettings.INITIAL_RETRIEVAL_MULTIPLIER
-
-            # Configure retriever
-            retriever = VectorIndexRetriever(
-                index=self.index,
-                similarity_top_k=initial_top_k,
-                verbose=True
-            )
-            
-            # Configure synthesizer based on response mode
-            response_mode_map = AppSettings.get_response_mode_map()
-            current_synthesizer = get_response_synthesizer(
-                response_mode=response_mode_map.get(response_mode, response_mode_map["compact"]),
-                use_async=False,
-                streaming=False
-            )
-            
-            # Create query engine with custom synthesizer
-            query_engine = RetrieverQueryEngine(
-                retriever=retriever,
-                response_synthesizer=current_synthesizer
-            )
-            
-            # Execute query
-            response = query_engine.query(query)
-            duration = time.time() - start_time
+            # Cached contexts are only valid for the collection contents they came from
+            self.context_cache.check_version(self.chroma_collection.count())
+            cache_key = (query, top_k, response_mode)
+            cached = self.context_cache.get(cache_key)
             
-            # Extract and enhance source nodes
-            source_nodes = []
-            chunks_for_logging = []
+            # Near-identical questions reuse a cached context; the embedding is kept for retrieval
+            query_embedding = None
+            if cached is None:
+                query_embedding = self._embed_queries([query])[0]
+                cached = self.context_cache.get_similar(query_embedding, cache_key[1:])
             
-            if hasattr(response, 'source_nodes') and response.source_nodes:
-                # Sort by score (descending) for better organization
-                sorted_nodes = sorted(response.source_nodes, 
-                                    key=lambda x: getattr(x, 'score', 0.0), 
-                                    reverse=True)
-                
-                for i, node in enumerate(sorted_nodes):
-                    # Extract metadata with error handling
-                    node_metadata = {}
-                    if hasattr(node, 'metadata') and node.metadata:
-                        node_metadata = node.metadata
-                    elif hasattr(node, 'node') and hasattr(node.node, 'metadata'):
-                        node_metadata = node.node.metadata
-                    
-                    # Create simplified metadata object
-                    simplified_metadata = SourceMetadata(
-                        #source_type=node_metadata.get('source_type', 'document'),
-                        doc_ref_id=node_metadata.get('DOC_REF_ID', ""),
-                        score=float(getattr(node, 'score', 0.0)),
+            if cached is not None:
+                self.logger.info("Context served from cache", {"query": query})
+                return cached
 
-                        DOC_DESCRIPTION=node_metadata.get("DOC_DESCRIPTION", ""),
-                        DOC_TITLE=node_metadata.get("DOC_TITLE", ""),
-                        DOC_DESCRIPTION_FORMATTED=node_metadata.get("DOC_DESCRIPTION_FORMATTED", ""),
-                        TAGS=node_metadata.get("TAGS", ""),
-                        PRESENTATION_DATE=node_metadata.get("PRESENTATION_DATE", ""),
-                        DOC_MODULE=node_metadata.get("DOC_MODULE", ""),
-                        PRESENTATION_LINK=node_metadata.get("PRESENTATION_LINK", ""),
-                        PRESENTER_1_NAME=node_metadata.get("PRESENTER_1_NAME", ""),
-                    )
-
-
-                    
-                    # Get node text with error handling
-                    node_text = ""
-                    if hasattr(node, 'text'):
-                        node_text = node.text
-                    elif hasattr(node, 'node') and hasattr(node.node, 'text'):
-                        node_text = node.node.text
-                    elif hasattr(node, 'get_content'):
-                        node_text = node.get_content()
-                    
-                    # Create source node object
-                    source_node = SourceNode(
-                        text=node_text,
-                        score=float(getattr(node, 'score', 0.0)),
-                        metadata=simplified_metadata,
-                        node_id=getattr(node, 'node_id', f"node_{i+1}")
-                    )
-                    
-                    source_nodes.append(source_node)
-                    
-                    # Add chunk for logging
-                    chunks_for_logging.append({
-                        "chunk_id": i + 1,
-                        "presention_link": simplified_metadata.PRESENTATION_LINK,
-                        # "doc_ref_id": simplified_metadata.doc_ref_id,
-                        "score": simplified_metadata.score,
-                        "text_length": len(node_text),
-                        "text_preview": node_text[:200] + "..." if len(node_text) > 200 else node_text
-                    })
-
-            if source_nodes:
-                # Rerank the nodes
-                source_nodes = self._rerank_nodes(query, source_nodes, top_k)
-            
-            # Prepare context with inline metadata
-            context_with_metadata = self._prepare_context_with_metadata(source_nodes)
+            result = self._retrieve([cache_key], [query_embedding])[0]
+            context_with_metadata, source_nodes = result[0], result[1]
             
             self.logger.info("Context extraction completed", {
                 "query": query,
-                "duration": duration,
+                "duration": time.time() - start_time,
                 "context_length": len(context_with_metadata),
                 "source_count": len(source_nodes),
                 "synthesis_method": response_mode,
             })
-            
-            return context_with_metadata, source_nodes, response_mode, chunks_for_logging
+            return result
             
         except Exception as e:
             self.logger.error("Context extraction failed", e, {"query": query})
             raise HTTPException(status_code=500, detail="Failed to extract context with metadata")
+    
+    def extract_context_batch(self, requests: List[Tuple[str, int, str]]) -> List[Tuple[str, List[SourceNode], str, List[dict]]]:
+        """
+        Extract contexts for several queries with shared embedding, retrieval and reranking
+        
+        Args:
+            requests: (query, top_k, response_mode) per query
+        
+        Returns:
+            extract_context() results in request order
+        """
+        if self.chroma_collection is None:
+            raise HTTPException(status_code=500, detail="Search index not available")
         
-    def _rerank_nodes(self, query: str, nodes: List[SourceNode], top_k: int) -> List[SourceNode]:
-        """Rerank nodes using cross-encoder"""
+        start_time = time.time()
+        queries = [query for query, _, _ in requests]
         try:
-            # Create pairs for reranking
-            pairs = [(query, node.text) for node in nodes]
+            self.context_cache.check_version(self.chroma_collection.count())
+            results = [self.context_cache.get(request) for request in requests]
+            misses = [i for i, result in enumerate(results) if result is None]
+            if not misses:
+                return results
             
-            # Get scores from reranker
-            scores = self.reranker.predict(pairs)
+            # Embed every query the context cache missed in one call
+            embeddings = self._embed_queries([queries[i] for i in misses])
+            pending = []
+            for i, embedding in zip(misses, embeddings):
+                results[i] = self.context_cache.get_similar(embedding, requests[i][1:])
+                if results[i] is None:
+                    pending.append((i, embedding))
+            if not pending:
+                return results
             
-            # Combine nodes with scores
-            scored_nodes = list(zip(nodes, scores))
-            print("Reranking pairs:", scored_nodes)
+            retrieved = self._retrieve(
+                [requests[i] for i, _ in pending],
+                [embedding for _, embedding in pending]
+            )
+            for (i, _), result in zip(pending, retrieved):
+                results[i] = result
             
-            # Sort by score descending
-            scored_nodes.sort(key=lambda x: x[1], reverse=True)
+            self.logger.info("Batch context extraction completed", {
+                "query_count": len(requests),
+                "retrieved_count": len(pending),
+                "duration": time.time() - start_time,
+            })
+            return results
+        
+        except Exception as e:
+            self.logger.error("Batch context extraction failed", e, {"queries": queries})
+            raise HTTPException(status_code=500, detail="Failed to extract context with metadata")
+    
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, reusing embeddings persisted by earlier requests or runs"""
+        embeddings = [None] * len(queries)
+        if self.embedding_cache is not None:
+            embeddings = self.embedding_cache.get_many(queries)
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            texts = [queries[i] for i in missing]
+            # One forward pass for every uncached query, with the query prompt get_query_embedding
+            # uses (the cache must not mix query and document embeddings under the same key)
+            computed = self.embed_model._embed(texts, prompt_name="query")
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(texts, computed)
+        return embeddings
+    
+    def _retrieve(self, requests: List[Tuple[str, int, str]], embeddings: List[List[float]]) -> List[Tuple[str, List[SourceNode], str, List[dict]]]:
+        """
+        Query Chroma, rerank and build contexts for embedded queries, caching each result
+        
+        Args:
+            requests: (query, top_k, response_mode) per query
+            embeddings: Query embeddings, parallel to requests
+        
+        Returns:
+            extract_context() results in request order
+        """
+        # One Chroma call for all query vectors, sized for the largest top_k; hits come back best first
+        initial_top_k = max(top_k for _, top_k, _ in requests) * AppSettings.INITIAL_RETRIEVAL_MULTIPLIER
+        retrieved = self.chroma_collection.query(
+            query_embeddings=embeddings,
+            n_results=initial_top_k,
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        candidates = []
+        for row, (_, top_k, _) in enumerate(requests):
+            limit = top_k * AppSettings.INITIAL_RETRIEVAL_MULTIPLIER
+            source_nodes = []
+            chunks_for_logging = []
+            hits = zip(retrieved["ids"][row], retrieved["documents"][row],
+                       retrieved["metadatas"][row], retrieved["distances"][row])
+            for rank, (node_id, text, metadata, distance) in enumerate(list(hits)[:limit]):
+                # Same distance-to-score conversion as the LlamaIndex Chroma store
+                source_node, chunk_log = self._make_source_node(
+                    rank, text or "", math.exp(-distance), metadata or {}, node_id
+                )
+                source_nodes.append(source_node)
+                chunks_for_logging.append(chunk_log)
+            candidates.append((source_nodes, chunks_for_logging))
+        
+        # Submitting every query's pairs together lets the batcher score them in one pass
+        try:
+            scores = self.rerank_batcher.predict_many([
+                (query, [node.text for node in source_nodes])
+                for (query, _, _), (source_nodes, _) in zip(requests, candidates)
+            ])
+        except Exception as e:
+            self.logger.error("Reranking failed", e)
+            scores = [None] * len(requests)
+        
+        results = []
+        for request, embedding, (source_nodes, chunks_for_logging), node_scores in zip(requests, embeddings, candidates, scores):
+            query, top_k, response_mode = request
+            if source_nodes:
+                # Rerank the nodes
+                source_nodes = self._rerank_nodes(query, source_nodes, top_k, node_scores)
+            
+            # Prepare context with inline metadata
+            context_with_metadata = self._prepare_context_with_metadata(source_nodes)
+            
+            result = (context_with_metadata, source_nodes, response_mode, chunks_for_logging)
+            self.context_cache.put(request, embedding, result)
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _copy_result(result: Tuple[str, List[SourceNode], str, List[dict]]) -> Tuple[str, List[SourceNode], str, List[dict]]:
+        """Copy an extract_context() result so cached and returned results share no mutable state"""
+        context_with_metadata, source_nodes, response_mode, chunks_for_logging = result
+        return (
+            context_with_metadata,
+            [node.model_copy(deep=True) for node in source_nodes],
+            response_mode,
+            [dict(chunk) for chunk in chunks_for_logging]
+        )
+    
+    def _make_source_node(self, i: int, node_text: str, score: float, node_metadata: dict, node_id: str) -> Tuple[SourceNode, dict]:
+        """Build a source node and its log entry from a retrieved chunk"""
+        # Create simplified metadata object (values come straight from the store; no validation pass)
+        get = node_metadata.get
+        simplified_metadata = SourceMetadata.model_construct(
+            #source_type=node_metadata.get('source_type', 'document'),
+            doc_ref_id=get('DOC_REF_ID', ""),
+            score=score,
+            **{key: get(key, "") for key in _META_KEYS}
+        )
+        
+        # Create source node object
+        source_node = SourceNode.model_construct(
+            text=node_text,
+            score=score,
+            metadata=simplified_metadata,
+            node_id=node_id
+        )
+        
+        # Chunk entry for logging
+        chunk_log = {
+            "chunk_id": i + 1,
+            "presention_link": simplified_metadata.PRESENTATION_LINK,
+            # "doc_ref_id": simplified_metadata.doc_ref_id,
+            "score": simplified_metadata.score,
+            "text_length": len(node_text),
+            "text_preview": node_text[:200] + "..." if len(node_text) > 200 else node_text
+        }
+        return source_node, chunk_log
+        
+    def _rerank_nodes(self, query: str, nodes: List[SourceNode], top_k: int, scores) -> List[SourceNode]:
+        """Rerank nodes by their cross-encoder scores (None if scoring failed)"""
+        if scores is None:
+            return nodes[:top_k]  # Fallback to original top_k
+        try:
+            scores = np.asarray(scores, dtype=np.float32)
+            if self.logger.is_enabled(logging.DEBUG):
+                # Only float scores; repr of the nodes would serialize every field and chunk text
+                self.logger.debug("Reranking scores", {"scores": scores.tolist()})
+            
+            # Indices of the top_k scores, best first (partial selection, then sort only those)
+            if len(scores) > top_k:
+                top = np.argpartition(-scores, top_k)[:top_k]
+                top = top[np.argsort(-scores[top], kind="stable")]
+            else:
+                top = np.argsort(-scores, kind="stable")
             
             # Take top_k and update their scores
             result = []
-            for node, new_score in scored_nodes[:top_k]:
+            for i in top:
                 # Update the score in metadata
-                node.metadata.score = float(new_score)
+                node = nodes[i]
+                node.metadata.score = float(scores[i])
                 result.append(node)
-
-            print("Reranked nodes:", result)    
             
             return result
         except Exception as e:
@@ -210,35 +343,35 @@ class VectorService:
         for i, node in enumerate(source_nodes, 1):
             metadata = node.metadata
             
-            chunk_text = normalize_text(node.text)
-
             # full_metadata = {}
             # if hasattr(node, 'node') and hasattr(node.node, 'metadata'):
             #     full_metadata = node.node.metadata
             # elif hasattr(node, 'metadata'):
             #     full_metadata = node.metadata
             
-            # Build simplified inline metadata block
-            metadata_block = f"""[METADATA]
-                PRESENTATION_LINK: {getattr(metadata, 'PRESENTATION_LINK', 'N/A')}
-                SCORE: {metadata.score:.3f}
-                TITLE: {getattr(metadata, 'DOC_TITLE', 'N/A')}
-                DESCRIPTION: {getattr(metadata, 'DOC_DESCRIPTION', 'N/A')}
-                DESCRIPTION_FORMATTED: {getattr(metadata, 'DOC_DESCRIPTION_FORMATTED', 'N/A')}
-                MODULE: {getattr(metadata, 'DOC_MODULE', 'N/A')}
-                PRESENTATION_DATE: {getattr(metadata, 'PRESENTATION_DATE', 'N/A')}
-                TAGS: {getattr(metadata, 'TAGS', 'N/A')}
-                [/METADATA]
-                """
-            
-            # Clean and format the content
-            chunk_text = node.text.strip()
-            if len(chunk_text) > AppSettings.MAX_CONTEXT_LENGTH:
-                chunk_text = chunk_text[:AppSettings.MAX_CONTEXT_LENGTH] + "\n... [Content truncated for length] ..."
+            # Build simplified inline metadata block (unindented, empty fields left out)
+            lines = ["[METADATA]"]
+            if metadata.PRESENTATION_LINK:
+                lines.append(f"PRESENTATION_LINK: {metadata.PRESENTATION_LINK}")
+            lines.append(f"SCORE: {metadata.score:.3f}")
+            for label, field in _CONTEXT_META_FIELDS:
+                value = getattr(metadata, field)
+                if value:
+                    lines.append(f"{label}: {value}")
+            lines.append("[/METADATA]")
+            
+            # Truncate first so only the kept text is normalized
+            chunk_text = node.text
+            truncated = len(chunk_text) > AppSettings.MAX_CONTEXT_LENGTH
+            if truncated:
+                chunk_text = chunk_text[:AppSettings.MAX_CONTEXT_LENGTH]
+            chunk_text = normalize_text(chunk_text)
+            if truncated:
+                chunk_text += "\n... [Content truncated for length] ..."
             
             # Combine metadata block with content
-            complete_chunk = f"{metadata_block}{chunk_text}"
-            context_parts.append(complete_chunk)
+            lines.append(chunk_text)
+            context_parts.append("\n".join(lines))
         
         # Join all chunks with separators
         return "\n\n---\n\n".join(context_parts)
\ No newline at end of file